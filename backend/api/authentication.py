@@ -0,0 +1,20 @@
+import time
+
+from rest_framework.authentication import TokenAuthentication
+
+from users import token_cache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса Token ⋈ User на каждый запрос:
+    результат проверки хранится в users.token_cache и отзывается
+    сигналами users.signals"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        filled_at = time.time()
+        user, token = super().authenticate_credentials(key)
+        token_cache.store(key, user, token, filled_at)
+        return user, token
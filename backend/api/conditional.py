@@ -0,0 +1,50 @@
+"""Условные GET-запросы: ETag и Last-Modified по дешёвым отметкам версий
+(recipes.versions, Recipe.updated_at), без сериализации и хэширования
+тела ответа."""
+from hashlib import md5
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+def request_fingerprint(request, *parts):
+    """Хэш запроса: хост, путь и нормализованная строка запроса,
+    плюс дополнительные части"""
+    query = '&'.join(
+        f'{key}={value}'
+        for key, values in sorted(request.query_params.lists())
+        for value in sorted(values)
+    )
+    return md5(
+        ':'.join(map(str, (
+            f'{request.get_host()}{request.path}?{query}', *parts
+        ))).encode()
+    ).hexdigest()
+
+
+def make_etag(request, *stamps):
+    """Сильный ETag: отметки версий данных плюс всё, от чего зависит
+    представление (параметры запроса, формат ответа)"""
+    return quote_etag(request_fingerprint(
+        request, request.accepted_media_type, *stamps
+    ))
+
+
+def conditional_response(request, handler, etag, last_modified=None):
+    """304 по If-None-Match/If-Modified-Since, иначе ответ handler()
+    с заголовками ETag и Last-Modified"""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = handler()
+        if response.status_code != 200:
+            return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Клиент хранит ответ, но перепроверяет его при каждом запросе
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -1,19 +1,16 @@
 import django_filters as filters
+from django.conf import settings
 from django.db.models import Q
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Ingredient 
+from recipes import search
+from recipes.models import Recipe
+from .recipe_ingredient_index import (MATCH_ALL, MATCH_MODES, filter_sql,
+                                      recipe_ingredient_index)
 
 
-class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(method='filter_name')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
-    
-    def filter_name(self, queryset, name, value):
-        return queryset.filter(name__istartswith=value)
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class RecipeFilter(filters.FilterSet):
@@ -22,19 +19,43 @@ class RecipeFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart'
     )
     author = filters.NumberFilter(field_name='author__id')
+    search = filters.CharFilter(method='filter_search')
+    ingredients = NumberInFilter(method='filter_ingredients')
+    ingredients_mode = filters.ChoiceFilter(
+        choices=[(mode, mode) for mode in MATCH_MODES],
+        method='filter_ingredients_mode'
+    )
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value == 1 and user.is_authenticated:
-            return queryset.filter(favorites__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value == 1 and user.is_authenticated:
-            return queryset.filter(shopping_carts__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
+    def filter_ingredients(self, queryset, name, value):
+        ingredient_ids = [int(pk) for pk in value]
+        mode = self.form.cleaned_data.get('ingredients_mode') or MATCH_ALL
+        if not settings.RECIPE_INGREDIENT_INDEX:
+            return filter_sql(queryset, ingredient_ids, mode)
+        recipe_ids = recipe_ingredient_index.match(ingredient_ids, mode)
+        if recipe_ids is None:
+            return filter_sql(queryset, ingredient_ids, mode)
+        return queryset.filter(id__in=recipe_ids)
+
+    def filter_ingredients_mode(self, queryset, name, value):
+        # Режим учитывается в filter_ingredients
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search.search(queryset, value)
+
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart')  
\ No newline at end of file
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'search',
+                  'ingredients', 'ingredients_mode')  
\ No newline at end of file
@@ -0,0 +1,176 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGE_VARIANTS = {
+    'thumbnail': (150, 150),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+IMAGE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIRECTORY = 'variants'
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+    thread_name_prefix='images'
+)
+
+
+def variant_name(key, variant, image_format):
+    """Путь варианта: variants/<key>_<вариант>.<формат>, где key — хэш
+    содержимого оригинала. Разные изображения не делят файлы вариантов,
+    даже если их оригиналы называются одинаково, а одинаковые делят."""
+    return os.path.join(
+        VARIANTS_DIRECTORY, f'{key}_{variant}.{image_format}'
+    )
+
+
+def variant_names(key):
+    return [
+        variant_name(key, variant, image_format)
+        for variant in IMAGE_VARIANTS
+        for image_format in IMAGE_FORMATS
+    ]
+
+
+def generate_variants(name):
+    """Сохраняет уменьшенные копии изображения во всех форматах и
+    возвращает их ключ (см. variant_name).
+
+    Уже существующие файлы не перезаписываются: по тому же ключу
+    лежат варианты тех же байтов оригинала.
+    """
+    with default_storage.open(name) as source:
+        content = source.read()
+    key = sha256(content).hexdigest()[:32]
+    pending = [
+        (variant, size, image_format)
+        for variant, size in IMAGE_VARIANTS.items()
+        for image_format in IMAGE_FORMATS
+        if not default_storage.exists(
+            variant_name(key, variant, image_format)
+        )
+    ]
+    if not pending:
+        return key
+
+    image = Image.open(BytesIO(content))
+    image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    if image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+
+    resized = {}
+    for variant, size, image_format in pending:
+        if variant not in resized:
+            resized[variant] = image.copy()
+            resized[variant].thumbnail(size, Image.LANCZOS)
+        pil_format, options = IMAGE_FORMATS[image_format]
+        buffer = BytesIO()
+        resized[variant].save(buffer, pil_format, **options)
+        default_storage.save(
+            variant_name(key, variant, image_format),
+            ContentFile(buffer.getvalue())
+        )
+    return key
+
+
+def save_variants_key(model, pk, field, name, key):
+    """Отмечает варианты готовыми, если изображение не сменили, пока они
+    строились. Через save(), чтобы сработали сигналы сброса кэшей."""
+    instance = model.objects.filter(pk=pk, **{field: name}).first()
+    if instance is None:
+        return False
+    key_field = f'{field}_variants_key'
+    setattr(instance, key_field, key)
+    instance.save(update_fields=[key_field, *(
+        # updated_at рецепта: от него зависят ETag и Last-Modified
+        model_field.name for model_field in model._meta.concrete_fields
+        if getattr(model_field, 'auto_now', False)
+    )])
+    return True
+
+
+def process_image(name, on_ready=None):
+    try:
+        key = generate_variants(name)
+    except Exception:
+        logger.exception(f'Не удалось обработать изображение {name}')
+        return
+    if on_ready:
+        on_ready(key)
+
+
+def schedule_variants(name, on_ready=None):
+    """Ставит обработку изображения в фоновый пул после коммита.
+
+    on_ready(key) вызывается, когда варианты готовы, — чтобы сохранить
+    ключ вариантов в модели (save_variants_key).
+    """
+    if name:
+        transaction.on_commit(
+            lambda: executor.submit(process_image, name, on_ready)
+        )
+
+
+def delete_variants(key):
+    """Удаляет варианты, если на них ссылается не больше одного
+    изображения — того, которое сейчас удаляют или заменяют"""
+    if not key:
+        return
+    references = (
+        Recipe.objects.filter(image_variants_key=key).count()
+        + get_user_model().objects.filter(avatar_variants_key=key).count()
+    )
+    if references > 1:
+        return
+    for target in variant_names(key):
+        if default_storage.exists(target):
+            default_storage.delete(target)
+
+
+def get_variant_urls(field_file, key, request=None):
+    """URL вариантов изображения; пока варианты не готовы (нет key) —
+    URL оригинала для каждого из них."""
+    if not field_file:
+        return None
+    return get_variant_urls_by_name(field_file.name, key, request)
+
+
+def get_variant_urls_by_name(name, key, request=None):
+    """Без обращений к хранилищу: готовность вариантов — это key"""
+    if not name:
+        return None
+
+    def build_url(path):
+        url = default_storage.url(path)
+        return request.build_absolute_uri(url) if request else url
+
+    return {
+        variant: {
+            image_format: build_url(
+                variant_name(key, variant, image_format) if key else name
+            )
+            for image_format in IMAGE_FORMATS
+        }
+        for variant in IMAGE_VARIANTS
+    }
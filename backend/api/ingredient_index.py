@@ -0,0 +1,63 @@
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS_VERSION_KEY, get_version
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    """Отсортированный по casefold-названию справочник ингредиентов
+    в памяти процесса для поиска по префиксу без обращения к БД.
+
+    Индекс перестраивается, когда меняется версия справочника
+    (см. recipes.signals).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.entries = ([], [])
+        self.lock = Lock()
+
+    def build(self, version):
+        rows = sorted(
+            (
+                (name.casefold(), pk, name, measurement_unit)
+                for pk, name, measurement_unit in
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                ).iterator()
+            ),
+            key=lambda row: (row[0], row[1])
+        )
+        self.entries = (
+            [row[0] for row in rows],
+            [
+                {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+                for _, pk, name, measurement_unit in rows
+            ]
+        )
+        self.version = version
+
+    def refresh(self):
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build(version)
+
+    def search(self, prefix):
+        """Ингредиенты, название которых начинается с prefix
+        (без учёта регистра); точные совпадения идут первыми."""
+        self.refresh()
+        prefix = prefix.casefold()
+        keys, rows = self.entries
+        # Точное совпадение — наименьший ключ с таким префиксом,
+        # поэтому в отсортированном срезе оно уже стоит первым.
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + MAX_CHAR, start)
+        return rows[start:end]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,89 @@
+import gzip
+import re
+from threading import Lock
+
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS_VERSION_KEY, get_version
+from .serializers.recipes import IngredientSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IDENTITY = 'identity'
+GZIP = 'gzip'
+BROTLI = 'br'
+
+COMPRESSORS = {GZIP: lambda data: gzip.compress(data, compresslevel=9)}
+if brotli is not None:
+    COMPRESSORS[BROTLI] = lambda data: brotli.compress(data, quality=11)
+
+# Предпочтение при равных q: лучшее сжатие первым
+PREFERENCE = (BROTLI, GZIP, IDENTITY)
+ACCEPT_ENCODING_ITEM = re.compile(
+    r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([01](?:\.\d{0,3})?))?\s*$'
+)
+
+
+def parse_accept_encoding(header):
+    weights = {}
+    for part in header.split(','):
+        match = ACCEPT_ENCODING_ITEM.match(part)
+        if match:
+            weights[match[1].lower()] = float(match[2] or 1)
+    return weights
+
+
+def choose_encoding(header):
+    """Кодировка ответа по заголовку Accept-Encoding"""
+    weights = parse_accept_encoding(header)
+
+    def weight(encoding):
+        if encoding in weights:
+            return weights[encoding]
+        return 1 if encoding == IDENTITY else weights.get('*', 0)
+
+    return max(
+        (encoding for encoding in PREFERENCE
+         if encoding == IDENTITY or encoding in COMPRESSORS),
+        key=lambda encoding: (weight(encoding), -PREFERENCE.index(encoding))
+    )
+
+
+class IngredientSnapshot:
+    """Весь справочник ингредиентов, один раз отрендеренный в JSON
+    и заранее сжатый gzip и brotli (если установлен пакет brotli).
+
+    Байты совпадают с ответом IngredientSerializer + JSONRenderer.
+    Снимок пересобирается, когда меняется версия справочника
+    (см. recipes.signals и import_ingredients).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.blobs = {}
+        self.lock = Lock()
+
+    def build(self, version):
+        data = JSONRenderer().render(
+            IngredientSerializer(Ingredient.objects.all(), many=True).data
+        )
+        blobs = {IDENTITY: data}
+        for encoding, compress in COMPRESSORS.items():
+            blobs[encoding] = compress(data)
+        self.blobs = blobs
+        self.version = version
+
+    def get(self, encoding=IDENTITY):
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build(version)
+        return self.blobs[encoding]
+
+
+ingredient_snapshot = IngredientSnapshot()
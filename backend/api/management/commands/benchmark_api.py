@@ -0,0 +1,305 @@
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.recipe_ingredient_index import recipe_ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from recipes.short_links import encode
+from users.models import Subscription, User
+
+METRICS = ('p50', 'p95', 'p99', 'queries', 'peak_memory')
+
+# Свой кэш в памяти процесса: прогон очищает кэш и не должен задевать
+# общий (CACHE_BACKEND), которым пользуется работающий сервис
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон эндпоинтов API на синтетических данных '
+            'в тестовой базе: задержки p50/p95/p99, число SQL-запросов и '
+            'пиковая память; сравнение с сохранённым эталоном')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument(
+            '--baseline', default='benchmark_baseline.json',
+            help='JSON-файл с эталонными метриками'
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Сохранить результаты прогона как новый эталон'
+        )
+        parser.add_argument(
+            '--margin', type=float, default=0.25,
+            help='Допустимое превышение эталона по времени и памяти (доля)'
+        )
+        parser.add_argument(
+            '--only', nargs='*', default=None,
+            help='Запустить только перечисленные эндпоинты'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        # Схема тестовой базы строится по текущим моделям, без миграций.
+        connection.settings_dict['TEST']['MIGRATE'] = False
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                cache.clear()
+                self.seed(options)
+                results = self.run_endpoints(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+        baseline_path = options['baseline']
+        if options['save_baseline']:
+            with open(baseline_path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(
+                f'Эталон сохранён в {baseline_path}'
+            ))
+        elif os.path.exists(baseline_path):
+            self.compare(results, baseline_path, options['margin'])
+
+    def seed(self, options):
+        random.seed(0)
+        users = User.objects.bulk_create(
+            User(username=f'bench{i}', email=f'bench{i}@example.com',
+                 first_name='Имя', last_name='Фамилия')
+            for i in range(options['users'])
+        )
+        users = list(User.objects.order_by('id'))
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(options['ingredients'])
+        )
+        ingredients = list(Ingredient.objects.order_by('id'))
+        Recipe.objects.bulk_create(
+            Recipe(author=users[i % len(users)], name=f'Рецепт {i}',
+                   image='recipes/images/benchmark.png',
+                   text='Описание рецепта ' * 20, cooking_time=30)
+            for i in range(options['recipes'])
+        )
+        recipes = list(Recipe.objects.order_by('id'))
+        per_recipe = min(options['ingredients_per_recipe'], len(ingredients))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=random.randint(1, 500))
+            for recipe in recipes
+            for ingredient in random.sample(ingredients, per_recipe)
+        )
+        self.user = users[0]
+        sample = random.sample(recipes, min(len(recipes) // 2, 50))
+        Favorite.objects.bulk_create(
+            Favorite(user=self.user, recipe=recipe) for recipe in sample
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=self.user, recipe=recipe) for recipe in sample
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=self.user, author=author)
+            for author in users[1:]
+        )
+        call_command('recount_counters', stdout=StringIO())
+        call_command('rebuild_feed', stdout=StringIO())
+        self.recipe = recipes[len(recipes) // 2]
+        self.toggle_recipe = next(
+            recipe for recipe in recipes if recipe not in sample
+        )
+        self.author = users[1]
+        self.ingredient_ids = [
+            item.ingredient_id for item in self.recipe.recipe_ingredients.all()
+        ]
+
+    def get_endpoints(self):
+        """Имя -> (метод, URL, с авторизацией[, переопределения настроек])"""
+        recipe_id = self.recipe.id
+        toggle_id = self.toggle_recipe.id
+        sql = {'RECIPE_INGREDIENT_INDEX': False}
+        serializers = {'FAST_READ_PATH': False}
+        ingredients = ','.join(map(str, self.ingredient_ids[:2]))
+        ingredients_any = ','.join(map(str, self.ingredient_ids))
+        return {
+            'recipes-list': ('get', '/api/recipes/', True),
+            'recipes-list-serializers': (
+                'get', '/api/recipes/', True, serializers),
+            'recipes-list-limit-100': ('get', '/api/recipes/?limit=100', True),
+            'recipes-list-limit-100-serializers': (
+                'get', '/api/recipes/?limit=100', True, serializers),
+            'recipes-list-cursor': ('get', '/api/recipes/?cursor=', True),
+            'recipes-list-anonymous': ('get', '/api/recipes/', False),
+            'recipes-list-author': (
+                'get', f'/api/recipes/?author={self.author.id}', True),
+            'recipes-list-favorited': (
+                'get', '/api/recipes/?is_favorited=1', True),
+            'recipes-list-in-cart': (
+                'get', '/api/recipes/?is_in_shopping_cart=1', True),
+            'recipes-list-ingredients-all': (
+                'get', f'/api/recipes/?ingredients={ingredients}', True),
+            'recipes-list-ingredients-all-sql': (
+                'get', f'/api/recipes/?ingredients={ingredients}', True, sql),
+            'recipes-list-ingredients-any': (
+                'get', f'/api/recipes/?ingredients={ingredients_any}'
+                '&ingredients_mode=any', True),
+            'recipes-list-ingredients-any-sql': (
+                'get', f'/api/recipes/?ingredients={ingredients_any}'
+                '&ingredients_mode=any', True, sql),
+            'recipes-list-ingredients-only': (
+                'get', f'/api/recipes/?ingredients={ingredients_any}'
+                '&ingredients_mode=only', True),
+            'recipes-list-ingredients-only-sql': (
+                'get', f'/api/recipes/?ingredients={ingredients_any}'
+                '&ingredients_mode=only', True, sql),
+            'recipes-feed': ('get', '/api/recipes/feed/', True),
+            'recipes-detail': ('get', f'/api/recipes/{recipe_id}/', True),
+            'recipes-detail-serializers': (
+                'get', f'/api/recipes/{recipe_id}/', True, serializers),
+            'recipes-detail-anonymous': (
+                'get', f'/api/recipes/{recipe_id}/', False),
+            'recipes-get-link': (
+                'get', f'/api/recipes/{recipe_id}/get-link/', True),
+            'recipes-favorite': (
+                'toggle', f'/api/recipes/{toggle_id}/favorite/', True),
+            'recipes-shopping-cart': (
+                'toggle', f'/api/recipes/{toggle_id}/shopping_cart/', True),
+            'recipes-download-shopping-cart': (
+                'get', '/api/recipes/download_shopping_cart/', True),
+            'ingredients-list': ('get', '/api/ingredients/', False),
+            'ingredients-search': (
+                'get', '/api/ingredients/?name=ингредиент 1', False),
+            'users-list': ('get', '/api/users/', True),
+            'users-detail': ('get', f'/api/users/{self.author.id}/', True),
+            'users-me': ('get', '/api/users/me/', True),
+            'users-subscriptions': (
+                'get', '/api/users/subscriptions/?recipes_limit=3', True),
+            'recipe-redirect': ('get', f'/s/{encode(recipe_id)}/', False),
+            'recipe-redirect-by-id': ('get', f'/s/{recipe_id}/', False),
+        }
+
+    def request(self, client, method, url):
+        if method == 'toggle':
+            response = client.post(url)
+            client.delete(url)
+        else:
+            response = client.get(url)
+        if response.status_code >= 400:
+            raise CommandError(f'{url}: HTTP {response.status_code}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def run_endpoints(self, options):
+        token = Token.objects.create(user=self.user)
+        authenticated = APIClient()
+        authenticated.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        anonymous = APIClient()
+        # Иначе первые замеры с индексом уйдут в SQL, пока он строится
+        recipe_ingredient_index.refresh(background=False)
+
+        results = {}
+        for name, (method, url, auth, *overrides) in (
+            self.get_endpoints().items()
+        ):
+            if options['only'] and name not in options['only']:
+                continue
+            client = authenticated if auth else anonymous
+            with override_settings(**dict(*overrides)):
+                results[name] = self.measure(client, method, url, options)
+        return results
+
+    def measure(self, client, method, url, options):
+        self.request(client, method, url)
+
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            self.request(client, method, url)
+        query_count = len(queries)
+
+        tracemalloc.start()
+        self.request(client, method, url)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        timings = []
+        for _ in range(options['iterations']):
+            start = time.perf_counter()
+            self.request(client, method, url)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        return {
+            'p50': round(statistics.median(timings), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'queries': query_count,
+            'peak_memory': peak_memory,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"эндпоинт":<32}{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}'
+            f'{"SQL":>6}{"память, КБ":>12}'
+        )
+        for name, metrics in results.items():
+            self.stdout.write(
+                f'{name:<32}{metrics["p50"]:>10.2f}{metrics["p95"]:>10.2f}'
+                f'{metrics["p99"]:>10.2f}{metrics["queries"]:>6}'
+                f'{metrics["peak_memory"] / 1024:>12.1f}'
+            )
+
+    def compare(self, results, baseline_path, margin):
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        failures = []
+        for name, metrics in results.items():
+            expected = baseline.get(name)
+            if not expected:
+                continue
+            for metric in METRICS:
+                if metric not in expected:
+                    continue
+                limit = expected[metric]
+                if metric != 'queries':
+                    limit *= 1 + margin
+                if metrics[metric] > limit:
+                    failures.append(
+                        f'{name}: {metric} {metrics[metric]} > {limit:g}'
+                    )
+        if failures:
+            raise CommandError(
+                'Превышен эталон производительности:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты в пределах эталона {baseline_path}'
+        ))
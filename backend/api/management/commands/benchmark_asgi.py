@@ -0,0 +1,238 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from recipes.short_links import encode
+from users.models import User
+from .benchmark_api import (BENCHMARK_CACHES, Command as BenchmarkCommand,
+                            percentile)
+
+DEFAULT_ENDPOINTS = ['recipe-redirect', 'recipes-get-link']
+
+
+async def asgi_request(application, method, path, headers):
+    """Один HTTP-запрос к ASGI-приложению; возвращает код ответа"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path,
+        'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), *headers],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    response = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    await application(scope, receive, send)
+    return response['status']
+
+
+class Command(BenchmarkCommand):
+    help = ('Сравнение синхронных представлений на --workers потоках '
+            '(как gunicorn --threads) с асинхронными (ASYNC_FAST_PATHS) '
+            'под ASGI: один цикл событий и столько же потоков для запросов '
+            'к базе; пропускная способность и задержки при --concurrency '
+            'одновременных клиентах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=5)
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Потоков синхронного воркера'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=64,
+            help='Одновременных клиентов'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Запросов на каждый эндпоинт и режим'
+        )
+        parser.add_argument(
+            '--db-latency', type=float, default=2.0,
+            help='Задержка каждого SQL-запроса, мс: сетевая база вместо '
+                 'SQLite в памяти'
+        )
+        parser.add_argument(
+            '--only', nargs='*', default=DEFAULT_ENDPOINTS,
+            help='Эндпоинты для прогона; recipes-favorite и '
+                 'recipes-shopping-cart пишут в базу и под нагрузкой '
+                 'имеют смысл только на PostgreSQL: SQLite блокирует '
+                 'таблицу на время записи'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        connection.settings_dict['TEST']['MIGRATE'] = False
+        old_config = setup_databases(verbosity=0, interactive=False)
+        delay = options['db_latency'] / 1000
+
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def install_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(add_latency)
+
+        if delay:
+            connection_created.connect(install_latency)
+            # Соединение текущего потока уже открыто
+            connection.execute_wrappers.append(add_latency)
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                cache.clear()
+                self.seed(options)
+                results = self.run_endpoints(options)
+        finally:
+            connection_created.disconnect(install_latency)
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        self.report(results)
+
+    def get_endpoints(self):
+        """Имя -> функция (номер клиента) -> (метод, путь, с авторизацией);
+        переключатели — пара POST и DELETE на своём рецепте клиента"""
+        recipe_id = self.recipe.id
+        return {
+            'recipe-redirect': lambda client: [
+                ('GET', f'/s/{encode(recipe_id)}/', False)],
+            'recipes-get-link': lambda client: [
+                ('GET', f'/api/recipes/{recipe_id}/get-link/', False)],
+            'recipes-favorite': lambda client: [
+                (method, f'/api/recipes/{self.recipe_ids[client]}'
+                         '/favorite/', True)
+                for method in ('POST', 'DELETE')],
+            'recipes-shopping-cart': lambda client: [
+                (method, f'/api/recipes/{self.recipe_ids[client]}'
+                         '/shopping_cart/', True)
+                for method in ('POST', 'DELETE')],
+        }
+
+    def run_endpoints(self, options):
+        concurrency = options['concurrency']
+        # У каждого клиента свой пользователь и свой рецепт
+        users = list(User.objects.order_by('id'))
+        self.tokens = [
+            Token.objects.get_or_create(user=users[i % len(users)])[0].key
+            for i in range(concurrency)
+        ]
+        self.recipe_ids = list(
+            Recipe.objects.exclude(
+                favorites__isnull=False
+            ).exclude(
+                shopping_carts__isnull=False
+            ).order_by('id').values_list('id', flat=True)[:concurrency]
+        )
+        if len(self.recipe_ids) < concurrency:
+            self.recipe_ids *= concurrency // len(self.recipe_ids) + 1
+
+        results = {}
+        for name, requests in self.get_endpoints().items():
+            if options['only'] and name not in options['only']:
+                continue
+            results[f'{name} sync x{options["workers"]}'] = (
+                asyncio.run(self.measure_sync(requests, options))
+            )
+            with override_settings(ASYNC_DB_THREADS=options['workers']):
+                results[f'{name} async'] = (
+                    asyncio.run(self.measure_async(requests, options))
+                )
+        return results
+
+    def headers(self, client, auth):
+        if not auth:
+            return []
+        return [(b'authorization', f'Token {self.tokens[client]}'.encode())]
+
+    async def run_clients(self, requests, options, send):
+        """Клиенты шлют запросы по очереди, пока не наберётся
+        --requests; задержка считается от отправки до ответа"""
+        remaining = options['requests']
+        timings = []
+        errors = 0
+
+        async def run_client(client):
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                for method, path, auth in requests(client):
+                    status = await send(client, method, path, auth)
+                    errors += status >= 400
+                timings.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            run_client(client) for client in range(options['concurrency'])
+        ))
+        elapsed = time.perf_counter() - start
+        return {
+            'rps': round(len(timings) / elapsed, 1),
+            'p50': round(statistics.median(timings), 3),
+            'p95': round(percentile(timings, 95), 3),
+            'p99': round(percentile(timings, 99), 3),
+            'errors': errors,
+        }
+
+    async def measure_sync(self, requests, options):
+        """WSGI: запрос занимает один из --workers потоков целиком"""
+        local = threading.local()
+
+        def call(client, method, path, auth):
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False)
+            extra = {}
+            if auth:
+                extra['HTTP_AUTHORIZATION'] = f'Token {self.tokens[client]}'
+            return local.client.generic(method, path, **extra).status_code
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            return await self.run_clients(
+                requests, options,
+                lambda *args: loop.run_in_executor(pool, call, *args)
+            )
+
+    async def measure_async(self, requests, options):
+        """ASGI: один цикл событий, запросы к базе — в пуле из --workers
+        потоков"""
+        from foodgram.asgi import application
+
+        async def send(client, method, path, auth):
+            return await asgi_request(
+                application, method, path, self.headers(client, auth)
+            )
+
+        return await self.run_clients(requests, options, send)
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"эндпоинт":<36}{"запр/с":>10}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"p99, мс":>10}{"ошибки":>8}'
+        )
+        for name, metrics in results.items():
+            self.stdout.write(
+                f'{name:<36}{metrics["rps"]:>10.1f}{metrics["p50"]:>10.2f}'
+                f'{metrics["p95"]:>10.2f}{metrics["p99"]:>10.2f}'
+                f'{metrics["errors"]:>8}'
+            )
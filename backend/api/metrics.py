@@ -0,0 +1,187 @@
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock, Thread
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PROCESS_KEY = 'metrics:process:{}'
+PROCESSES_KEY = 'metrics:processes'
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('total', 'db', 'app', 'render')
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def add(self, counts, total, count):
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+
+class RequestMetrics:
+    """Гистограммы длительности запросов по маршрутам.
+
+    Ключ — имя маршрута (для DRF это basename-action, например
+    recipes-list), метод и фаза: total, db (SQL), app (код представления
+    без SQL — в основном сериализация) и render.
+
+    Каждый процесс копит метрики в памяти и раз в METRICS_FLUSH_INTERVAL
+    секунд фоновым потоком публикует их в общий кэш; /api/metrics/
+    складывает снимки всех процессов, поэтому ответ не зависит от того,
+    какой воркер его отдал. Снимок процесса, который не публиковал
+    метрики METRICS_PROCESS_TIMEOUT секунд, пропадает, и суммы
+    уменьшаются — Prometheus считает это сбросом счётчиков. С кэшем в
+    памяти процесса (LocMemCache) видны только метрики текущего процесса.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.histograms = defaultdict(Histogram)
+        self.queries = defaultdict(int)
+        self.responses = defaultdict(int)
+        self.process_id = None
+
+    def observe(self, route, method, status, timings, query_count):
+        with self.lock:
+            for phase, value in timings.items():
+                self.histograms[(route, method, phase)].observe(value)
+            self.queries[(route, method)] += query_count
+            self.responses[(route, method, status)] += 1
+            if self.process_id is None:
+                # Поток и id — в воркере, а не в мастере до fork
+                self.process_id = uuid4().hex
+                Thread(target=self.run_flusher, name='metrics',
+                       daemon=True).start()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось опубликовать метрики')
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': {
+                    key: (list(histogram.counts), histogram.sum,
+                          histogram.count)
+                    for key, histogram in self.histograms.items()
+                },
+                'queries': dict(self.queries),
+                'responses': dict(self.responses),
+            }
+
+    def flush(self):
+        """Публикует метрики процесса в общий кэш"""
+        if self.process_id is None:
+            return
+        timeout = settings.METRICS_PROCESS_TIMEOUT
+        cache.set(
+            PROCESS_KEY.format(self.process_id), self.snapshot(), timeout
+        )
+        # Одновременная запись другим процессом может потерять эту
+        # отметку; она восстановится при следующей публикации
+        now = time.time()
+        processes = {
+            process_id: seen
+            for process_id, seen in (cache.get(PROCESSES_KEY) or {}).items()
+            if seen + timeout > now
+        }
+        processes[self.process_id] = now
+        cache.set(PROCESSES_KEY, processes, timeout)
+
+    def collect(self):
+        """Метрики всех процессов: свои — из памяти, чужие — из кэша"""
+        snapshots = [self.snapshot()]
+        other_keys = [
+            PROCESS_KEY.format(process_id)
+            for process_id in cache.get(PROCESSES_KEY) or {}
+            if process_id != self.process_id
+        ]
+        snapshots.extend(cache.get_many(other_keys).values())
+
+        histograms = defaultdict(Histogram)
+        queries = defaultdict(int)
+        responses = defaultdict(int)
+        for snapshot in snapshots:
+            for key, values in snapshot['histograms'].items():
+                histograms[key].add(*values)
+            for key, count in snapshot['queries'].items():
+                queries[key] += count
+            for key, count in snapshot['responses'].items():
+                responses[key] += count
+        return histograms, queries, responses
+
+    def render_prometheus(self):
+        histograms, queries, responses = (
+            sorted(metrics.items()) for metrics in self.collect()
+        )
+
+        lines = [
+            '# HELP foodgram_request_duration_seconds '
+            'Request duration by route and phase.',
+            '# TYPE foodgram_request_duration_seconds histogram',
+        ]
+        for (route, method, phase), histogram in histograms:
+            labels = f'route="{route}",method="{method}",phase="{phase}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(
+                    'foodgram_request_duration_seconds_bucket'
+                    f'{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                'foodgram_request_duration_seconds_bucket'
+                f'{{{labels},le="+Inf"}} {histogram.count}'
+            )
+            lines.append(
+                f'foodgram_request_duration_seconds_sum{{{labels}}} '
+                f'{histogram.sum}'
+            )
+            lines.append(
+                f'foodgram_request_duration_seconds_count{{{labels}}} '
+                f'{histogram.count}'
+            )
+
+        lines += [
+            '# HELP foodgram_sql_queries_total SQL queries by route.',
+            '# TYPE foodgram_sql_queries_total counter',
+        ]
+        for (route, method), count in queries:
+            lines.append(
+                f'foodgram_sql_queries_total'
+                f'{{route="{route}",method="{method}"}} {count}'
+            )
+
+        lines += [
+            '# HELP foodgram_responses_total Responses by route and status.',
+            '# TYPE foodgram_responses_total counter',
+        ]
+        for (route, method, status), count in responses:
+            lines.append(
+                f'foodgram_responses_total{{route="{route}",'
+                f'method="{method}",status="{status}"}} {count}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
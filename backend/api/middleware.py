@@ -0,0 +1,106 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+
+from recipes.async_db import query_wrappers
+from .metrics import request_metrics
+
+
+class RequestTimingMiddleware:
+    """Замеряет число и время SQL-запросов, время представления и
+    рендеринга; отдаёт их в заголовке Server-Timing и копит гистограммы
+    по маршрутам для /api/metrics/.
+
+    Работает и под ASGI: там ORM выполняется не в потоке цикла событий.
+    Для асинхронных представлений счётчик SQL передаётся пулу
+    database_sync_to_async, для синхронных — ставится в process_view,
+    который Django вызывает в том же потоке, что и само представление."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = self.start(request)
+        start = time.perf_counter()
+        with connection.execute_wrapper(self.sql_timer(timing)):
+            response = self.get_response(request)
+        return self.finish(request, response, start)
+
+    async def __acall__(self, request):
+        timing = self.start(request)
+        timing['wrappers'] = []
+        token = query_wrappers.set((self.sql_timer(timing),))
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_wrappers.reset(token)
+            for wrappers, wrapper in timing['wrappers']:
+                wrappers.remove(wrapper)
+        return self.finish(request, response, start)
+
+    @staticmethod
+    def start(request):
+        request._timing = {
+            'queries': 0, 'db': 0.0, 'view_start': None, 'view_end': None
+        }
+        return request._timing
+
+    def finish(self, request, response, start):
+        timing = request._timing
+        end = time.perf_counter()
+
+        view_start = timing['view_start'] or start
+        view_end = timing['view_end'] or end
+        timings = {
+            'total': end - start,
+            'db': timing['db'],
+            'app': max(view_end - view_start - timing['db'], 0.0),
+            'render': end - view_end,
+        }
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings["db"] * 1000:.1f};'
+            f'desc="SQL x{timing["queries"]}"',
+            f'app;dur={timings["app"] * 1000:.1f}',
+            f'render;dur={timings["render"] * 1000:.1f}',
+            f'total;dur={timings["total"] * 1000:.1f}',
+        ])
+
+        resolver_match = request.resolver_match
+        route = ((resolver_match.url_name or resolver_match.view_name)
+                 if resolver_match else 'unmatched')
+        request_metrics.observe(
+            route, request.method, response.status_code,
+            timings, timing['queries']
+        )
+        return response
+
+    @staticmethod
+    def sql_timer(timing):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timing['db'] += time.perf_counter() - start
+                timing['queries'] += 1
+        return wrapper
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = request._timing
+        timing['view_start'] = time.perf_counter()
+        if 'wrappers' in timing:
+            wrapper = self.sql_timer(timing)
+            connection.execute_wrappers.append(wrapper)
+            timing['wrappers'].append((connection.execute_wrappers, wrapper))
+
+    def process_template_response(self, request, response):
+        request._timing['view_end'] = time.perf_counter()
+        return response
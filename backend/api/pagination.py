@@ -1,7 +1,146 @@
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.feed import timeline
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class RecipePagination(CustomPagination):
+    """Постраничная выдача рецептов.
+
+    По умолчанию работает как CustomPagination (page/limit). Если в запросе
+    есть параметр cursor (в том числе пустой — первая страница), включается
+    keyset-пагинация по (pub_date, id): без COUNT(*) и OFFSET, с
+    непрозрачными курсорами в next/previous. Результаты поиска (search)
+    отсортированы по релевантности, поэтому всегда отдаются по страницам.
+    """
+    cursor_query_param = 'cursor'
+    ranked_query_params = ('search',)
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = (
+            self.cursor_query_param in request.query_params
+            and not any(param in request.query_params
+                        for param in self.ranked_query_params)
+        )
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+
+        if position is None:
+            queryset = queryset.order_by('-pub_date', '-id')
+        elif reverse:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+            ).order_by('pub_date', 'id')
+        else:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            ).order_by('-pub_date', '-id')
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page_results = results
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            direction, pub_date, pk = b64decode(
+                encoded.encode('ascii'), validate=True
+            ).decode('ascii').split('|')
+            return direction == 'p', (datetime.fromisoformat(pub_date),
+                                      int(pk))
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def get_position(recipe):
+        """(pub_date, id) рецепта: модели или строки .values()"""
+        if isinstance(recipe, dict):
+            return recipe['pub_date'], recipe['id']
+        return recipe.pub_date, recipe.pk
+
+    def encode_cursor(self, direction, recipe):
+        pub_date, pk = self.get_position(recipe)
+        position = f'{direction}|{pub_date.isoformat()}|{pk}'
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param,
+            b64encode(position.encode('ascii')).decode('ascii')
+        )
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self.encode_cursor('n', self.page_results[-1])
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.encode_cursor('p', self.page_results[0])
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+class FeedPagination(RecipePagination):
+    """Курсорная пагинация ленты подписок (recipes.feed.timeline).
+
+    Лента листается только вперёд: previous всегда пуст.
+    """
+    ranked_query_params = ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+        if reverse:
+            raise NotFound(self.invalid_cursor_message)
+
+        ids = timeline(request.user, position, page_size + 1)
+        self.has_next = len(ids) > page_size
+        self.has_previous = False
+        ids = ids[:page_size]
+        recipes = queryset.in_bulk(ids)
+        self.page_results = [recipes[pk] for pk in ids if pk in recipes]
+        return self.page_results
@@ -0,0 +1,206 @@
+import logging
+from threading import Lock, Thread
+
+from django.db import connection
+from django.db.models import Count, Q
+
+from recipes.models import RecipeIngredient
+from recipes.versions import (RECIPES_VERSION_KEY, get_changed_recipes,
+                              get_version)
+
+logger = logging.getLogger(__name__)
+
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+MATCH_ONLY = 'only'
+MATCH_MODES = (MATCH_ALL, MATCH_ANY, MATCH_ONLY)
+
+# Если процесс отстал больше чем на столько версий, индекс дешевле
+# перестроить целиком, чем читать журнал изменений.
+MAX_JOURNAL_GAP = 500
+
+# Номера установленных битов для каждого значения байта
+BYTE_BITS = tuple(
+    tuple(bit for bit in range(8) if value >> bit & 1)
+    for value in range(256)
+)
+
+
+def ids_bitmap(ids):
+    """Битовая карта из списка id: один проход и одно int.from_bytes
+    вместо | на каждый id, который копирует растущее число"""
+    bits = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        bits[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bitmap_ids(bitmap):
+    """Номера установленных битов по возрастанию"""
+    ids = []
+    for offset, byte in enumerate(
+        bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    ):
+        if byte:
+            base = offset * 8
+            ids.extend(base + bit for bit in BYTE_BITS[byte])
+    return ids
+
+
+class RecipeIngredientIndex:
+    """Инвертированный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Списки рецептов хранятся битовыми картами (int, бит = id рецепта),
+    поэтому пересечение и объединение — это & и |. Для режима
+    «только эти ингредиенты» дополнительно хранится состав каждого
+    рецепта.
+
+    Индекс обновляется точечно по журналу изменённых рецептов
+    (recipes.versions.bump_recipes) и перестраивается целиком, если
+    журнал недоступен. Полная перестройка идёт в фоновом потоке, а
+    запросы до её окончания обслуживает SQL (filter_sql).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.postings = {}
+        self.recipes = {}
+        self.lock = Lock()
+        self.builder = None
+
+    def load(self):
+        """(postings, recipes) по всей таблице состава рецептов"""
+        recipe_ids = {}
+        recipes = {}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator():
+            recipe_ids.setdefault(ingredient_id, []).append(recipe_id)
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+        postings = {
+            ingredient_id: ids_bitmap(ids)
+            for ingredient_id, ids in recipe_ids.items()
+        }
+        return postings, {
+            recipe_id: frozenset(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+
+    def build(self, version):
+        self.postings, self.recipes = self.load()
+        self.version = version
+
+    def build_in_background(self, version):
+        try:
+            postings, recipes = self.load()
+            with self.lock:
+                self.postings, self.recipes = postings, recipes
+                self.version = version
+        except Exception:
+            logger.exception('Не удалось перестроить индекс ингредиентов')
+        finally:
+            connection.close()
+
+    def update(self, recipe_ids, version):
+        """Перечитывает состав изменённых рецептов"""
+        fresh = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            fresh[recipe_id].add(ingredient_id)
+
+        for recipe_id, ingredients in fresh.items():
+            old = self.recipes.get(recipe_id, frozenset())
+            bit = 1 << recipe_id
+            for ingredient_id in old - ingredients:
+                bitmap = self.postings[ingredient_id] & ~bit
+                if bitmap:
+                    self.postings[ingredient_id] = bitmap
+                else:
+                    del self.postings[ingredient_id]
+            for ingredient_id in ingredients - old:
+                self.postings[ingredient_id] = (
+                    self.postings.get(ingredient_id, 0) | bit
+                )
+            if ingredients:
+                self.recipes[recipe_id] = frozenset(ingredients)
+            else:
+                self.recipes.pop(recipe_id, None)
+        self.version = version
+
+    def refresh(self, background=True):
+        """True, если индекс актуален. Если нужна полная перестройка,
+        запускает её в фоне и возвращает False (background=False —
+        перестраивает сразу: для команд и тестов)"""
+        version = get_version(RECIPES_VERSION_KEY)
+        if version == self.version:
+            return True
+        with self.lock:
+            if version == self.version:
+                return True
+            changed = None
+            if (self.version is not None
+                    and 0 < version - self.version <= MAX_JOURNAL_GAP):
+                changed = get_changed_recipes(self.version, version)
+            if changed is not None:
+                self.update(changed, version)
+                return True
+            if not background:
+                self.build(version)
+                return True
+            if self.builder is None or not self.builder.is_alive():
+                self.builder = Thread(
+                    target=self.build_in_background, args=(version,),
+                    name='recipe-ingredient-index', daemon=True
+                )
+                self.builder.start()
+            return False
+
+    def match(self, ingredient_ids, mode=MATCH_ALL):
+        """id рецептов по возрастанию, содержащих все (all), хотя бы один
+        (any) или только (only) из перечисленных ингредиентов; None, пока
+        индекс перестраивается"""
+        if not self.refresh():
+            return None
+        postings = self.postings
+        bitmaps = [postings.get(pk, 0) for pk in set(ingredient_ids)]
+        if not bitmaps:
+            return []
+        result = bitmaps[0]
+        if mode == MATCH_ALL:
+            for bitmap in bitmaps[1:]:
+                result &= bitmap
+            return bitmap_ids(result)
+        for bitmap in bitmaps[1:]:
+            result |= bitmap
+        if mode == MATCH_ANY:
+            return bitmap_ids(result)
+        allowed = frozenset(ingredient_ids)
+        return [
+            recipe_id for recipe_id in bitmap_ids(result)
+            if self.recipes.get(recipe_id, frozenset()) <= allowed
+        ]
+
+
+def filter_sql(queryset, ingredient_ids, mode=MATCH_ALL):
+    """Тот же отбор средствами SQL: эталон для сравнения и запасной путь"""
+    ingredient_ids = set(ingredient_ids)
+    rows = RecipeIngredient.objects.order_by()
+    if mode == MATCH_ANY:
+        matching = rows.filter(
+            ingredient_id__in=ingredient_ids
+        ).values('recipe_id')
+    elif mode == MATCH_ALL:
+        matching = rows.filter(
+            ingredient_id__in=ingredient_ids
+        ).values('recipe_id').annotate(
+            total=Count('ingredient_id', distinct=True)
+        ).filter(total=len(ingredient_ids)).values('recipe_id')
+    else:
+        matching = rows.values('recipe_id').annotate(
+            foreign=Count('id', filter=~Q(ingredient_id__in=ingredient_ids))
+        ).filter(foreign=0).values('recipe_id')
+    return queryset.filter(id__in=matching)
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+from api.images import get_variant_urls
+
+
+class ImageVariantsField(serializers.Field):
+    """URL уменьшенных копий изображения (см. api.images)"""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        return get_variant_urls(
+            getattr(instance, self.image_field),
+            getattr(instance, f'{self.image_field}_variants_key'),
+            self.context.get('request')
+        )
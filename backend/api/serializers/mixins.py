@@ -0,0 +1,40 @@
+from rest_framework import serializers
+
+FIELDS_QUERY_PARAM = 'fields'
+OMIT_QUERY_PARAM = 'omit'
+
+
+def parse_names(value):
+    names = (part.strip() for part in value.split(','))
+    return [name for name in names if name]
+
+
+def get_sparse_fields(request, available):
+    """Поля ответа с учётом ?fields= и ?omit=; неизвестные имена — 400"""
+    available = tuple(available)
+    if request is None:
+        return available
+    only = parse_names(request.query_params.get(FIELDS_QUERY_PARAM, ''))
+    omit = parse_names(request.query_params.get(OMIT_QUERY_PARAM, ''))
+    unknown = set(only + omit) - set(available)
+    if unknown:
+        raise serializers.ValidationError({
+            'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}'
+        })
+    return tuple(
+        name for name in available
+        if (not only or name in only) and name not in omit
+    )
+
+
+class SparseFieldsMixin:
+    """Оставляет в сериализаторе только поля, запрошенные через
+    ?fields=id,name или исключённые через ?omit=text"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = get_sparse_fields(
+            self.context.get('request'), self.fields
+        )
+        for name in set(self.fields) - set(selected):
+            self.fields.pop(name)
@@ -1,14 +1,23 @@
 from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from django.conf import settings
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.core.files.base import ContentFile
 import base64
+import binascii
+from functools import partial
 
 from recipes.models import (Recipe, Ingredient,
                            RecipeIngredient, Favorite,
                            ShoppingCart)
+from recipes import cart_totals
 
 from users.models import User
+from api.images import save_variants_key, schedule_variants
 from api.serializers.users import UserSerializer
+from api.serializers.fields import ImageVariantsField
+from api.serializers.mixins import SparseFieldsMixin
 
 import logging
 logger = logging.getLogger(__name__)
@@ -17,9 +26,15 @@ logger = logging.getLogger(__name__)
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
+            try:
+                format, imgstr = data.split(';base64,')
+                content = base64.b64decode(imgstr)
+            except (ValueError, binascii.Error):
+                raise serializers.ValidationError(
+                    'Строка не соответствует формату data:mime;base64,'
+                )
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = ContentFile(content, name='temp.' + ext)
         return super().to_internal_value(data)
 
 
@@ -42,9 +57,9 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    # Существование ингредиентов проверяется одним запросом
+    # в RecipeWriteSerializer.validate_ingredients
+    id = serializers.IntegerField(min_value=1)
     amount = serializers.IntegerField(min_value=1)
 
     class Meta:
@@ -53,13 +68,26 @@ class IngredientCreateSerializer(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField('image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = fields
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX_BATCH
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class RecipeListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredients',
@@ -68,20 +96,25 @@ class RecipeListSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_variants = ImageVariantsField('image')
 
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_variants', 'text', 'cooking_time')
         read_only_fields = fields
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request and not request.user.is_anonymous and 
                 Favorite.objects.filter(user=request.user, recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request and not request.user.is_anonymous and 
                 ShoppingCart.objects.filter(user=request.user, recipe=obj).exists())
@@ -100,11 +133,26 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError('Нужен хотя бы один ингредиент')
         
-        ingredient_ids = [ingredient['id'].id for ingredient in value]
+        ingredient_ids = [ingredient['id'] for ingredient in value]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise serializers.ValidationError('Ингредиенты не должны повторяться')
-        
-        return value
+
+        found = Ingredient.objects.in_bulk(ingredient_ids)
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'
+        ]
+        errors = [
+            {} if pk in found else {'id': [ErrorDetail(
+                message.format(pk_value=pk), code='does_not_exist'
+            )]}
+            for pk in ingredient_ids
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [
+            {'id': found[ingredient['id']], 'amount': ingredient['amount']}
+            for ingredient in value
+        ]
 
     def create_ingredients(self, recipe, ingredients):
         RecipeIngredient.objects.bulk_create(
@@ -115,11 +163,52 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             ) for ingredient in ingredients
         )
 
+    def update_ingredients(self, recipe, ingredients):
+        """Приводит состав рецепта к ingredients: не больше одного
+        bulk_create, одного bulk_update и одного delete.
+        Возвращает старый и новый состав {ingredient_id: amount}."""
+        existing = {
+            item.ingredient_id: item
+            for item in recipe.recipe_ingredients.all()
+        }
+        old_amounts = {pk: item.amount for pk, item in existing.items()}
+        new_amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+
+        to_create, to_update = [], []
+        for ingredient in ingredients:
+            item = existing.get(ingredient['id'].id)
+            if item is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient['id'],
+                    amount=ingredient['amount']
+                ))
+            elif item.amount != ingredient['amount']:
+                item.amount = ingredient['amount']
+                to_update.append(item)
+        to_delete = [
+            item.pk for pk, item in existing.items() if pk not in new_amounts
+        ]
+
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        return old_amounts, new_amounts
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         recipe = super().create(validated_data)
         self.create_ingredients(recipe, ingredients)
+        schedule_variants(recipe.image.name, partial(
+            save_variants_key, Recipe, recipe.pk, 'image', recipe.image.name
+        ))
         return recipe
 
     def validate(self, data):
@@ -131,11 +220,22 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
-        instance.recipe_ingredients.all().delete()
-        self.create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        old_amounts, new_amounts = self.update_ingredients(
+            instance, ingredients
+        )
+        cart_totals.update_recipe(instance.pk, old_amounts, new_amounts)
+        if 'image' in validated_data:
+            instance.image_variants_key = ''
+        instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            schedule_variants(instance.image.name, partial(
+                save_variants_key, Recipe, instance.pk, 'image',
+                instance.image.name
+            ))
+        return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        prefetch_related_objects([instance], 'recipe_ingredients__ingredient')
         return RecipeListSerializer(instance, context=context).data
\ No newline at end of file
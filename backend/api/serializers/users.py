@@ -2,10 +2,18 @@ from djoser.serializers import UserSerializer as BaseUserSerializer
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 import base64
+import binascii
+from functools import partial
 import uuid
+from io import BytesIO
 from django.core.files.base import ContentFile
+from PIL import Image
 import logging
 
+from api.images import (delete_variants, get_variant_urls, save_variants_key,
+                        schedule_variants)
+from api.serializers.fields import ImageVariantsField
+
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
@@ -13,18 +21,31 @@ User = get_user_model()
 class UserSerializer(BaseUserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     avatar = serializers.SerializerMethodField(read_only=True)
+    avatar_variants = ImageVariantsField('avatar')
 
     class Meta(BaseUserSerializer.Meta):
         model = User
         fields = ('email', 'id', 'username', 'first_name',
-                  'last_name', 'is_subscribed', 'avatar')
+                  'last_name', 'is_subscribed', 'avatar', 'avatar_variants')
         read_only_fields = ('email', 'id', 'username', 'first_name',
-                          'last_name', 'is_subscribed', 'avatar')
+                            'last_name', 'is_subscribed', 'avatar',
+                            'avatar_variants')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        return (request and request.user.is_authenticated and 
-                request.user.subscriptions.filter(author=obj).exists())
+        return (request and request.user.is_authenticated
+                and obj.id in self.get_subscribed_ids(request))
+
+    @staticmethod
+    def get_subscribed_ids(request):
+        """Id авторов, на которых подписан пользователь, один раз на запрос"""
+        if not hasattr(request, '_subscribed_ids'):
+            request._subscribed_ids = set(
+                request.user.subscriptions.values_list('author_id', flat=True)
+            )
+        return request._subscribed_ids
         
     def get_avatar(self, obj):
         request = self.context.get('request')
@@ -35,23 +56,27 @@ class UserSerializer(BaseUserSerializer):
 
 class SubscribedAuthorSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.IntegerField(source='recipes.count', read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         model = User
         fields = ('email', 'id', 'username', 'first_name',
-                  'last_name', 'is_subscribed', 'recipes', 'recipes_count', 'avatar')
+                  'last_name', 'is_subscribed', 'recipes', 'recipes_count',
+                  'avatar', 'avatar_variants')
         read_only_fields = ('email', 'id', 'username', 'first_name',
-                           'last_name', 'is_subscribed', 'recipes', 'recipes_count', 'avatar')  
+                            'last_name', 'is_subscribed', 'recipes',
+                            'recipes_count', 'avatar', 'avatar_variants')
 
     def get_recipes(self, obj):
         from api.serializers.recipes import RecipeSerializer
         
-        request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit and limit.isdigit():
-            recipes = recipes[:int(limit)]
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            limit = request.query_params.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit and limit.isdigit():
+                recipes = recipes[:int(limit)]
         return RecipeSerializer(recipes, many=True, context=self.context).data
 
 
@@ -66,9 +91,12 @@ class AvatarSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if instance.avatar and hasattr(instance.avatar, 'url'):
             return {
-                'avatar': request.build_absolute_uri(instance.avatar.url)
+                'avatar': request.build_absolute_uri(instance.avatar.url),
+                'avatar_variants': get_variant_urls(
+                    instance.avatar, instance.avatar_variants_key, request
+                )
             }
-        return {'avatar': None}
+        return {'avatar': None, 'avatar_variants': None}
         
     def validate_avatar(self, value):
         if not value or not isinstance(value, str):
@@ -76,23 +104,32 @@ class AvatarSerializer(serializers.ModelSerializer):
             
         if 'data:' not in value or ';base64,' not in value:
             raise serializers.ValidationError('Строка не соответствует формату data:mime;base64,')
-            
-        return value
 
-    def update(self, instance, validated_data):
-        avatar_data = validated_data.get('avatar')
-        
-        format, imgstr = avatar_data.split(';base64,')
+        try:
+            format, imgstr = value.split(';base64,')
+            content = base64.b64decode(imgstr)
+            Image.open(BytesIO(content)).verify()
+        except (binascii.Error, ValueError, OSError):
+            raise serializers.ValidationError(
+                'Загрузите корректное изображение'
+            )
+
         ext = format.split('/')[-1]
-        
-        file_name = f"{uuid.uuid4()}.{ext}"
-        
-        data = ContentFile(base64.b64decode(imgstr), name=file_name)
-        
+        return ContentFile(content, name=f"{uuid.uuid4()}.{ext}")
+
+    def update(self, instance, validated_data):
+        data = validated_data.get('avatar')
+
         if instance.avatar:
-            instance.avatar.delete()
+            delete_variants(instance.avatar_variants_key)
+            instance.avatar.delete(save=False)
             
         instance.avatar = data
-        instance.save()
+        instance.avatar_variants_key = ''
+        instance.save(update_fields=['avatar', 'avatar_variants_key'])
+        schedule_variants(instance.avatar.name, partial(
+            save_variants_key, User, instance.pk, 'avatar',
+            instance.avatar.name
+        ))
         
         return instance
@@ -0,0 +1,67 @@
+import csv
+import json
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def author_name(recipe):
+    return recipe.author.get_full_name() or recipe.author.username
+
+
+def render_txt(ingredients, recipes, date):
+    yield f'Список покупок от {date}\n'
+    yield '\n'
+    yield 'Продукты:\n'
+    for i, item in enumerate(ingredients, 1):
+        yield (f'{i}. {item["ingredient__name"].capitalize()} '
+               f'({item["ingredient__measurement_unit"]}) — '
+               f'{item["amount"]}\n')
+    yield '\n'
+    yield 'Рецепты:\n'
+    for recipe in recipes:
+        yield f'• {recipe.name} (автор: {author_name(recipe)})\n'
+
+
+def render_csv(ingredients, recipes, date):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['Продукт', 'Единица измерения', 'Количество'])
+    for item in ingredients:
+        yield writer.writerow([
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['amount']
+        ])
+    yield writer.writerow([])
+    yield writer.writerow(['Рецепт', 'Автор'])
+    for recipe in recipes:
+        yield writer.writerow([recipe.name, author_name(recipe)])
+
+
+def render_json(ingredients, recipes, date):
+    yield f'{{"date": {json.dumps(date)}, "ingredients": ['
+    for i, item in enumerate(ingredients):
+        yield (', ' if i else '') + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['amount']
+        }, ensure_ascii=False)
+    yield '], "recipes": ['
+    for i, recipe in enumerate(recipes):
+        yield (', ' if i else '') + json.dumps({
+            'id': recipe.id,
+            'name': recipe.name,
+            'author': author_name(recipe)
+        }, ensure_ascii=False)
+    yield ']}'
+
+
+SHOPPING_LIST_RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import User
+from .test_query_counts import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TransactionTestCase):
+    """ETag меняется вместе с данными ответа, а кэш выдачи
+    сбрасывается после фиксации транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pw',
+            first_name='Автор', last_name='Рецептов'
+        )
+        self.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Суп', image='recipes/images/test.png',
+            text='Описание', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.salt, amount=5
+        )
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def assert_not_modified(self, client, url):
+        """ETag ответа; повторный запрос с ним получает 304"""
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        return etag
+
+    def assert_modified(self, client, url, etag):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response.json()
+
+    def test_recipe_edit_changes_etag(self):
+        client = APIClient()
+        etag = self.assert_not_modified(client, self.url)
+        response = self.client_for(self.author).patch(self.url, {
+            'name': 'Борщ', 'text': 'Описание', 'cooking_time': 10,
+            'ingredients': [{'id': self.salt.id, 'amount': 7}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        recipe = self.assert_modified(client, self.url, etag)
+        self.assertEqual(recipe['name'], 'Борщ')
+        self.assertEqual(recipe['ingredients'][0]['amount'], 7)
+
+    def test_favorite_changes_etag_for_user(self):
+        client = self.client_for(self.author)
+        etag = self.assert_not_modified(client, self.url)
+        self.assertEqual(
+            client.post(f'{self.url}favorite/').status_code, 201
+        )
+        recipe = self.assert_modified(client, self.url, etag)
+        self.assertTrue(recipe['is_favorited'])
+
+    def test_ingredient_change_changes_etag(self):
+        client = APIClient()
+        etag = self.assert_not_modified(client, '/api/ingredients/')
+        Ingredient.objects.create(name='перец', measurement_unit='г')
+        names = [
+            item['name']
+            for item in self.assert_modified(client, '/api/ingredients/', etag)
+        ]
+        self.assertEqual(names, ['перец', 'соль'])
+
+        self.salt.name = 'соль морская'
+        self.salt.save()
+        recipe = APIClient().get(self.url).json()
+        self.assertEqual(recipe['ingredients'][0]['name'], 'соль морская')
+
+    def test_new_recipe_resets_list_cache(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/recipes/').json()['count'], 1)
+        Recipe.objects.create(
+            author=self.author, name='Каша', image='recipes/images/test.png',
+            text='Описание', cooking_time=10
+        )
+        self.assertEqual(client.get('/api/recipes/').json()['count'], 2)
@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes import feed
+from recipes.models import FeedEntry, Recipe
+from users.models import User
+from .test_query_counts import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES, FEED_WINDOW=2,
+                   FEED_FANOUT_MAX_SUBSCRIBERS=1,
+                   FEED_FANOUT_MIN_SUBSCRIBERS=0)
+class FeedTests(TransactionTestCase):
+    """Раскладка рецептов по лентам при публикации и подписке и
+    переключение популярного автора на чтение при запросе ленты"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = self.create_user('author')
+        self.readers = [self.create_user(f'reader{i}') for i in range(2)]
+        self.recipes = [self.publish(i) for i in range(3)]
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com',
+            password='pw', first_name='Имя', last_name='Фамилия'
+        )
+
+    def publish(self, number):
+        return Recipe.objects.create(
+            author=self.author, name=f'Рецепт {number}',
+            image='recipes/images/test.png', text='Описание',
+            cooking_time=10
+        )
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def subscribe(self, reader):
+        response = self.client_for(reader).post(
+            f'/api/users/{self.author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def unsubscribe(self, reader):
+        response = self.client_for(reader).delete(
+            f'/api/users/{self.author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+
+    def feed_ids(self, reader):
+        response = self.client_for(reader).get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def newest(self, count):
+        return [recipe.id for recipe in reversed(self.recipes)][:count]
+
+    def fanout(self):
+        self.author.refresh_from_db()
+        return self.author.feed_fanout
+
+    def test_subscribe_backfills_window(self):
+        self.subscribe(self.readers[0])
+        self.assertEqual(FeedEntry.objects.count(), 2)
+        self.assertEqual(self.feed_ids(self.readers[0]), self.newest(2))
+
+        self.recipes.append(self.publish(3))
+        self.assertEqual(self.feed_ids(self.readers[0]), self.newest(3))
+
+        self.unsubscribe(self.readers[0])
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed_ids(self.readers[0]), [])
+
+    def test_popular_author_switches_with_hysteresis(self):
+        for reader in self.readers:
+            self.subscribe(reader)
+        self.assertEqual(feed.update_fanout(), (1, 0))
+        self.assertFalse(self.fanout())
+        self.assertFalse(FeedEntry.objects.exists())
+        self.recipes.append(self.publish(3))
+        for reader in self.readers:
+            self.assertEqual(self.feed_ids(reader), self.newest(4))
+
+        # Подписчиков меньше MAX, но больше MIN: автор остаётся популярным
+        self.unsubscribe(self.readers[1])
+        self.assertEqual(feed.update_fanout(), (0, 0))
+        self.assertFalse(self.fanout())
+
+        self.unsubscribe(self.readers[0])
+        self.assertEqual(feed.update_fanout(), (0, 1))
+        self.assertTrue(self.fanout())
+        self.subscribe(self.readers[0])
+        self.assertEqual(self.feed_ids(self.readers[0]), self.newest(2))
@@ -0,0 +1,113 @@
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from users.models import Subscription, User
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecipeQueryCountTests(TestCase):
+    """Число запросов выдачи рецептов не зависит от размера страницы
+    и состава рецепта: флаги избранного, корзины и подписки читаются
+    в основном запросе, а не по запросу на рецепт"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pw',
+            first_name='Читатель', last_name='Рецептов'
+        )
+        authors = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='pw', first_name='Автор', last_name=str(i)
+            )
+            for i in range(5)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(10)
+        ]
+        for i in range(60):
+            recipe = Recipe.objects.create(
+                author=authors[i % len(authors)], name=f'Рецепт {i}',
+                image='recipes/images/test.png', text='Описание',
+                cooking_time=10
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in ingredients[:1 + i % len(ingredients)]
+            )
+            if i % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if i % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        for author in authors:
+            Subscription.objects.create(user=cls.user, author=author)
+        cls.token = Token.objects.create(user=cls.user)
+        cls.small = Recipe.objects.order_by('id').first()
+        cls.large = Recipe.objects.order_by('id')[len(ingredients) - 1]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def count_queries(self, url):
+        # Первый запрос заполняет кэш токенов и версий
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_same_queries(self, small_url, large_url):
+        for fast_read in (True, False):
+            with self.subTest(fast_read=fast_read), override_settings(
+                FAST_READ_PATH=fast_read
+            ):
+                expected = self.count_queries(small_url)
+                self.client.get(large_url)
+                with self.assertNumQueries(expected):
+                    response = self.client.get(large_url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        self.assert_same_queries(
+            '/api/recipes/?limit=1', '/api/recipes/?limit=50'
+        )
+
+    def test_list_flags_match_viewer_state(self):
+        results = self.client.get('/api/recipes/?limit=50').json()['results']
+        self.assertEqual(len(results), 50)
+        for recipe in results:
+            self.assertEqual(recipe['is_favorited'], Favorite.objects.filter(
+                user=self.user, recipe_id=recipe['id']
+            ).exists())
+            self.assertEqual(
+                recipe['is_in_shopping_cart'],
+                ShoppingCart.objects.filter(
+                    user=self.user, recipe_id=recipe['id']
+                ).exists()
+            )
+
+    def test_subscriptions_queries_do_not_grow_with_recipes_limit(self):
+        self.assert_same_queries(
+            '/api/users/subscriptions/?recipes_limit=1',
+            '/api/users/subscriptions/?recipes_limit=5'
+        )
+
+    def test_detail_queries_do_not_grow_with_ingredients(self):
+        self.assert_same_queries(
+            f'/api/recipes/{self.small.id}/', f'/api/recipes/{self.large.id}/'
+        )
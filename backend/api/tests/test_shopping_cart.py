@@ -0,0 +1,157 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingCartIngredient)
+from users.models import User
+from .test_query_counts import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ShoppingCartTests(TransactionTestCase):
+    """Сводный список покупок и счётчики избранного после правки и
+    удаления рецепта и после пакетных запросов"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pw',
+            first_name='Автор', last_name='Рецептов'
+        )
+        self.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pw',
+            first_name='Покупатель', last_name='Продуктов'
+        )
+        self.salt, self.flour, self.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'мука', 'сахар')
+        )
+        self.bread = self.create_recipe('Хлеб', {self.salt: 10,
+                                                 self.flour: 500})
+        self.soup = self.create_recipe('Суп', {self.salt: 5})
+        self.client = self.client_for(self.user)
+        self.client_token = self.user.auth_token.key
+
+    def create_recipe(self, name, amounts):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, image='recipes/images/test.png',
+            text='Описание', cooking_time=10
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def add_to_cart(self, *recipes):
+        for recipe in recipes:
+            response = self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+            self.assertEqual(response.status_code, 201)
+
+    def totals(self):
+        return {
+            name: (amount, count)
+            for name, amount, count in ShoppingCartIngredient.objects.filter(
+                user=self.user
+            ).values_list('ingredient__name', 'total_amount', 'recipe_count')
+        }
+
+    def bulk(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'recipes': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['status'] for item in response.json()['results']]
+
+    def test_recipe_edit_updates_totals(self):
+        self.add_to_cart(self.bread, self.soup)
+        response = self.client_for(self.author).patch(
+            f'/api/recipes/{self.bread.id}/', {
+                'name': 'Сладкий хлеб', 'text': 'Описание',
+                'cooking_time': 10,
+                'ingredients': [{'id': self.salt.id, 'amount': 2},
+                                {'id': self.sugar.id, 'amount': 30}],
+            }, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(), {'соль': (7, 2), 'сахар': (30, 1)})
+
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', HTTP_ACCEPT='text/plain'
+        )
+        text = b''.join(response.streaming_content).decode()
+        self.assertIn('Сахар (г) — 30', text)
+        self.assertNotIn('Мука', text)
+
+    def test_recipe_delete_updates_totals(self):
+        self.add_to_cart(self.bread, self.soup)
+        response = self.client_for(self.author).delete(
+            f'/api/recipes/{self.bread.id}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals(), {'соль': (5, 1)})
+
+    def test_bulk_shopping_cart(self):
+        url = '/api/recipes/shopping_cart/bulk/'
+        ids = [self.bread.id, self.soup.id, 999]
+        self.assertEqual(self.bulk('post', url, ids),
+                         ['added', 'added', 'not_found'])
+        self.assertEqual(self.bulk('post', url, ids),
+                         ['already_present', 'already_present', 'not_found'])
+        self.assertEqual(self.totals(),
+                         {'соль': (15, 2), 'мука': (500, 1)})
+
+        self.assertEqual(self.bulk('delete', url, [self.bread.id]),
+                         ['removed'])
+        self.assertEqual(self.bulk('delete', url, [self.bread.id]),
+                         ['not_present'])
+        self.assertEqual(self.totals(), {'соль': (5, 1)})
+        self.assertEqual(
+            list(ShoppingCart.objects.filter(
+                user=self.user
+            ).values_list('recipe_id', flat=True)),
+            [self.soup.id]
+        )
+
+    def test_bulk_favorite_counters(self):
+        url = '/api/recipes/favorite/bulk/'
+        ids = [self.bread.id, self.soup.id]
+        self.bulk('post', url, ids)
+        self.bulk('post', url, ids)
+        self.assertEqual(self.favorites_counts(), [1, 1])
+
+        self.assertEqual(self.bulk('delete', url, ids),
+                         ['removed', 'removed'])
+        self.assertEqual(self.favorites_counts(), [0, 0])
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def favorites_counts(self):
+        return list(Recipe.objects.filter(
+            id__in=[self.bread.id, self.soup.id]
+        ).order_by('id').values_list('favorites_count', flat=True))
+
+    async def test_download_under_asgi(self):
+        """Ответ читается в цикле событий, где запросы к базе запрещены"""
+        await sync_to_async(self.add_to_cart)(self.bread)
+        response = await AsyncClient().get(
+            '/api/recipes/download_shopping_cart/',
+            # AsyncClient Django 3.2 передаёт extra как имена заголовков
+            authorization=f'Token {self.client_token}', accept='text/plain'
+        )
+        self.assertEqual(response.status_code, 200)
+        text = b''.join(response.streaming_content).decode()
+        self.assertIn('Мука (г) — 500', text)
+        self.assertIn('Хлеб (автор: Автор Рецептов)', text)
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import (SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from rest_framework.test import APIClient
+
+from recipes import short_links
+from recipes.models import Recipe
+from users.models import User
+from .test_query_counts import LOCMEM_CACHES
+
+
+class ShortCodeTests(SimpleTestCase):
+
+    def test_codes_round_trip(self):
+        codes = set()
+        for recipe_id in (1, 2, 3, 999, 2 ** 40):
+            code = short_links.encode(recipe_id)
+            self.assertEqual(len(code), short_links.CODE_LENGTH)
+            self.assertEqual(short_links.decode(code), recipe_id)
+            codes.add(code)
+        self.assertEqual(len(codes), 5)
+
+    def test_invalid_codes(self):
+        for code in ('', 'abc', 'abcdefgh', 'abc-def', 'ZZZZZZZ'):
+            self.assertIsNone(short_links.decode(code))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ShortLinkRedirectTests(TransactionTestCase):
+    """Редирект по коду из get-link и по старым ссылкам с id; удалённый
+    рецепт сразу перестаёт открываться"""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pw',
+            first_name='Автор', last_name='Рецептов'
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Суп', image='recipes/images/test.png',
+            text='Описание', cooking_time=10
+        )
+        self.client = APIClient()
+
+    def short_path(self):
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/get-link/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['short-link'].replace('http://testserver', '')
+
+    def test_redirect(self):
+        target = f'/recipes/{self.recipe.id}/'
+        path = self.short_path()
+        self.assertEqual(
+            path, f'/s/{short_links.encode(self.recipe.id)}/'
+        )
+        for url in (path, f'/s/{self.recipe.id}/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(response['Location'], target)
+
+    def test_deleted_recipe_not_found(self):
+        recipe_id = self.recipe.id
+        path = self.short_path()
+        self.recipe.delete()
+        for url in (path, f'/s/{recipe_id}/',
+                    f'/api/recipes/{recipe_id}/get-link/'):
+            self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,101 @@
+import base64
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users import token_cache
+from users.models import User
+from .test_query_counts import LOCMEM_CACHES
+
+
+def image_data_url():
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TokenCacheTests(TransactionTestCase):
+    """Кэш токенов: отзыв при выходе и смене пароля, и запись
+    пользователя из кэша не затирает счётчики"""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.local_cache.entries.clear()
+        self.user = User.objects.create_user(
+            username='owner', email='owner@example.com',
+            password='Passw0rd!x', first_name='Имя', last_name='Фамилия'
+        )
+        self.follower = User.objects.create_user(
+            username='follower', email='follower@example.com',
+            password='Passw0rd!x', first_name='Имя', last_name='Фамилия'
+        )
+        self.client = self.client_for(self.user)
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def warm_cache(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.assertIsNotNone(token_cache.get(self.user.auth_token.key))
+
+    def subscribe_follower(self):
+        response = self.client_for(self.follower).post(
+            f'/api/users/{self.user.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def assert_subscribers(self, expected):
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.subscribers_count, expected)
+
+    @mock.patch('api.serializers.users.schedule_variants')
+    def test_avatar_update_keeps_counters(self, schedule_variants):
+        self.warm_cache()
+        self.subscribe_follower()
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': image_data_url()},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_subscribers(1)
+
+        self.warm_cache()
+        self.assertEqual(
+            self.client.delete('/api/users/me/avatar/').status_code, 204
+        )
+        self.assert_subscribers(1)
+
+    def test_set_password_keeps_counters_and_revokes(self):
+        self.warm_cache()
+        self.subscribe_follower()
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'Passw0rd!x',
+            'new_password': 'Other0rd!yy',
+        }, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assert_subscribers(1)
+        self.assertIsNone(token_cache.get(self.user.auth_token.key))
+
+    def test_logout_revokes_cached_token(self):
+        self.warm_cache()
+        self.assertEqual(
+            self.client.post('/api/auth/token/logout/').status_code, 204
+        )
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_deactivation_revokes_cached_token(self):
+        self.warm_cache()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
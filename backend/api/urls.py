@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from .views.recipes import RecipeViewSet, IngredientViewSet
 from .views.users import UserViewSet  
+from .views.metrics import MetricsView
 
 import logging
 logger = logging.getLogger(__name__)
@@ -19,6 +20,7 @@ for route in router_v1.urls:
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router_v1.urls)),
 ]
 
@@ -0,0 +1,116 @@
+"""Асинхронные версии частых и маленьких эндпоинтов рецептов:
+избранное, корзина и короткая ссылка.
+
+Под ASGI-сервером (ASYNC_FAST_PATHS) обслуживают те же URL, что и
+действия RecipeViewSet, и отвечают теми же данными и кодами. Пока идёт
+запрос к базе, цикл событий обслуживает другие соединения. В Django 3.2
+нет асинхронного ORM, поэтому каждое обращение к базе — отдельный шаг
+database_sync_to_async; в Django 4.1+ это aget()/aexists()/acreate().
+"""
+from django.http import HttpResponse
+from django.urls import reverse
+from rest_framework import exceptions, status
+from rest_framework.views import exception_handler
+
+from recipes import short_links
+from recipes.async_db import database_sync_to_async
+from recipes.models import Favorite, Recipe, ShoppingCart
+from ..authentication import CachedTokenAuthentication
+from ..renderers import FastJSONRenderer
+from ..serializers.recipes import RecipeSerializer
+
+authenticator = CachedTokenAuthentication()
+renderer = FastJSONRenderer()
+
+
+def json_response(data=None, status_code=status.HTTP_200_OK, headers=()):
+    response = HttpResponse(
+        renderer.render(data), content_type=renderer.media_type,
+        status=status_code
+    )
+    for name, value in headers:
+        response[name] = value
+    return response
+
+
+def error_response(exc):
+    """Ответ на исключение API, как у APIView.handle_exception"""
+    if isinstance(exc, (exceptions.NotAuthenticated,
+                        exceptions.AuthenticationFailed)):
+        exc.auth_header = authenticator.authenticate_header(None)
+    response = exception_handler(exc, {})
+    return json_response(
+        response.data, response.status_code, response.headers.items()
+    )
+
+
+async def authenticate(request):
+    result = await database_sync_to_async(
+        authenticator.authenticate
+    )(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    return result[0]
+
+
+async def recipe_relation(request, pk, model_class):
+    try:
+        user = await authenticate(request)
+        if request.method not in ('POST', 'DELETE'):
+            raise exceptions.MethodNotAllowed(request.method)
+        recipe = await database_sync_to_async(
+            Recipe.objects.filter(pk=pk).first
+        )()
+        if recipe is None:
+            raise exceptions.NotFound()
+
+        if request.method == 'POST':
+            _, created = await database_sync_to_async(
+                model_class.objects.get_or_create
+            )(user=user, recipe=recipe)
+            if not created:
+                verbose_name = model_class._meta.verbose_name
+                return json_response({
+                    'errors': f'Рецепт "{recipe.name}" уже в {verbose_name}!'
+                }, status.HTTP_400_BAD_REQUEST)
+            data = await database_sync_to_async(
+                lambda: RecipeSerializer(
+                    recipe, context={'request': request}
+                ).data
+            )()
+            return json_response(data, status.HTTP_201_CREATED)
+
+        deleted, _ = await database_sync_to_async(
+            model_class.objects.filter(user=user, recipe=recipe).delete
+        )()
+        if not deleted:
+            raise exceptions.NotFound()
+        return json_response(status_code=status.HTTP_204_NO_CONTENT)
+    except exceptions.APIException as exc:
+        return error_response(exc)
+
+
+async def favorite(request, pk):
+    return await recipe_relation(request, pk, Favorite)
+
+
+async def shopping_cart(request, pk):
+    return await recipe_relation(request, pk, ShoppingCart)
+
+
+async def get_link(request, pk):
+    try:
+        # Неверный токен — 401, как и в RecipeViewSet
+        await database_sync_to_async(authenticator.authenticate)(request)
+        if request.method != 'GET':
+            raise exceptions.MethodNotAllowed(request.method)
+        exists = await database_sync_to_async(
+            Recipe.objects.filter(pk=pk).exists
+        )()
+        if not exists:
+            raise exceptions.NotFound()
+    except exceptions.APIException as exc:
+        return error_response(exc)
+    return json_response({'short-link': request.build_absolute_uri(
+        reverse('recipe_redirect', args=[short_links.encode(pk)])
+    )})
@@ -0,0 +1,16 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..metrics import request_metrics
+from ..renderers import PlainTextRenderer
+
+
+class MetricsView(APIView):
+    """Метрики запросов всех процессов сервиса в формате Prometheus
+    (см. api.metrics.RequestMetrics)"""
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        return Response(request_metrics.render_prometheus())
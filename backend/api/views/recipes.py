@@ -1,24 +1,44 @@
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Value, BooleanField
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.cache import patch_vary_headers
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS, AllowAny
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from datetime import datetime
-from io import BytesIO
+from functools import partial
 
+from recipes import cart_totals, short_links
 from recipes.models import (Recipe, Ingredient,
                             Favorite, ShoppingCart,
-                            RecipeIngredient)
+                            ShoppingCartIngredient)
+from recipes.signals import counted_in_bulk
+from recipes.versions import (INGREDIENTS_VERSION_KEY, RECIPES_VERSION_KEY,
+                              bump_version, get_ingredients_modified,
+                              get_version, recipe_version_key, user_state_key)
 from ..serializers.recipes import (RecipeListSerializer, RecipeWriteSerializer,
-                                 IngredientSerializer,
-                                 RecipeSerializer)
+                                   IngredientSerializer,
+                                   RecipeSerializer, RecipeIdsSerializer)
+from ..serializers.mixins import get_sparse_fields
 from ..permissions import IsAuthorOrReadOnly
-from ..pagination import CustomPagination
-from ..filters import IngredientFilter, RecipeFilter
+from ..conditional import (conditional_response, make_etag,
+                           request_fingerprint)
+from ..pagination import FeedPagination, RecipePagination
+from ..projections import RecipeProjector
+from ..filters import RecipeFilter
+from ..ingredient_index import ingredient_index
+from ..ingredient_snapshot import (IDENTITY, choose_encoding,
+                                   ingredient_snapshot)
+from ..renderers import PlainTextRenderer, CSVRenderer
+from ..shopping_list import SHOPPING_LIST_RENDERERS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,15 +46,42 @@ logger = logging.getLogger(__name__)
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_queryset(self):
-        return Recipe.objects.all().prefetch_related(
-            'recipe_ingredients__ingredient'
-        ).select_related('author')
+        queryset = Recipe.objects.all()
+        if self.request.method in SAFE_METHODS:
+            # Не читаем то, что ?fields=/?omit= исключили из ответа
+            fields = get_sparse_fields(
+                self.request, RecipeListSerializer.Meta.fields
+            )
+        else:
+            fields = RecipeListSerializer.Meta.fields
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(
+                'recipe_ingredients__ingredient'
+            )
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'text' not in fields:
+            queryset = queryset.defer('text')
+        user = self.request.user
+        if user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                ))
+            )
+        return queryset.annotate(
+            is_favorited=Value(False, output_field=BooleanField()),
+            is_in_shopping_cart=Value(False, output_field=BooleanField())
+        )
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -44,6 +91,88 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_cache_key(self, version_key):
+        """Ключ кэша ответа для анонимного GET: версия данных
+        плюс нормализованная строка запроса."""
+        digest = request_fingerprint(self.request)
+        return (f'recipes:{self.action}:{get_version(version_key)}:'
+                f'{get_version(INGREDIENTS_VERSION_KEY)}:{digest}')
+
+    def cached_response(self, handler, version_key, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        cache_key = self.get_cache_key(version_key)
+        data = cache.get(cache_key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(cache_key, response.data,
+                      settings.RECIPES_CACHE_TIMEOUT)
+            return response
+        return Response(data)
+
+    def use_fast_read(self):
+        """Быстрая выдача (api.projections) — только для JSON: формам
+        browsable API нужны сериализаторы"""
+        return (settings.FAST_READ_PATH
+                and self.request.accepted_renderer.format == 'json')
+
+    def fast_list(self, request, *args, **kwargs):
+        projector = RecipeProjector(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = projector.values(queryset)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(projector.project(rows))
+        return self.get_paginated_response(projector.project(page))
+
+    def fast_retrieve(self, request, *args, **kwargs):
+        projector = RecipeProjector(request)
+        row = projector.values(self.filter_queryset(
+            self.get_queryset()
+        )).filter(pk=kwargs[self.lookup_field]).first()
+        if row is None:
+            raise Http404
+        return Response(projector.project([row])[0])
+
+    def list(self, request, *args, **kwargs):
+        handler = self.fast_list if self.use_fast_read() else super().list
+        return self.cached_response(
+            handler, RECIPES_VERSION_KEY, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_field)
+        if not str(pk).isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        updated_at = Recipe.objects.filter(pk=pk).values_list(
+            'updated_at', flat=True
+        ).first()
+        if updated_at is None:
+            raise Http404
+        user = request.user
+        if user.is_authenticated:
+            # Флаги избранного, корзины и подписки не отражены
+            # в updated_at, поэтому только ETag
+            stamps = (user.id, get_version(user_state_key(user.id)))
+            last_modified = None
+        else:
+            stamps = ()
+            last_modified = int(updated_at.timestamp())
+        etag = make_etag(
+            request, updated_at.isoformat(),
+            get_version(INGREDIENTS_VERSION_KEY), *stamps
+        )
+        if self.use_fast_read():
+            handler = self.fast_retrieve
+        else:
+            handler = super().retrieve
+        return conditional_response(request, partial(
+            self.cached_response, handler, recipe_version_key(pk),
+            request, *args, **kwargs
+        ), etag, last_modified)
+
     def handle_favorite_or_shopping_cart(self, request, pk, model_class):
         user = request.user
         recipe = get_object_or_404(Recipe, id=pk)
@@ -82,40 +211,131 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=False,
             permission_classes=[IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь,
+        от новых к старым"""
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def apply_bulk_counters(self, model_class, user, recipe_ids, sign):
+        """bulk_create не вызывает сигналы, а удаление идёт под
+        counted_in_bulk, поэтому счётчики избранного и сводный список
+        покупок обновляются здесь — одним запросом на всю пачку, а не по
+        запросу на рецепт в сигналах"""
+        if model_class is Favorite:
+            Recipe.objects.filter(id__in=recipe_ids).update(
+                favorites_count=F('favorites_count') + sign
+            )
+        else:
+            cart_totals.add_recipes([user.id], recipe_ids, sign)
+
+    def handle_bulk(self, request, model_class):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+
+        with transaction.atomic():
+            # Рецепты блокируются раньше пользователя, как и при удалении
+            # рецепта: иначе рецепт из пачки удалят между проверкой и
+            # вставкой, и счётчики получат строку без рецепта
+            found = set(Recipe.objects.select_for_update().filter(
+                id__in=ids
+            ).order_by('pk').values_list('id', flat=True))
+            # Пачки одного пользователя выполняются по очереди: иначе две
+            # параллельные прочитают одинаковый present, обе ответят
+            # added и дважды прибавят счётчики
+            list(type(user).objects.select_for_update().filter(
+                pk=user.pk
+            ).values_list('pk'))
+            queryset = model_class.objects.select_for_update().filter(
+                user=user, recipe_id__in=found
+            )
+            present = set(queryset.values_list('recipe_id', flat=True))
+            if request.method == 'POST':
+                changed = [pk for pk in ids if pk in found - present]
+                model_class.objects.bulk_create(
+                    [model_class(user=user, recipe_id=pk) for pk in changed],
+                    ignore_conflicts=True
+                )
+                sign, done, skipped = 1, 'added', 'already_present'
+            else:
+                changed = [pk for pk in ids if pk in present]
+                with counted_in_bulk():
+                    model_class.objects.filter(
+                        user=user, recipe_id__in=changed
+                    ).delete()
+                sign, done, skipped = -1, 'removed', 'not_present'
+            if changed:
+                self.apply_bulk_counters(model_class, user, changed, sign)
+                transaction.on_commit(partial(
+                    bump_version, user_state_key(user.id)
+                ))
+
+        changed = set(changed)
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in found
+                    else done if pk in changed else skipped
+                )
+            }
+            for pk in ids
+        ]})
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=[IsAuthenticated],
+            url_path='favorite/bulk')
+    def favorite_bulk(self, request):
+        return self.handle_bulk(request, Favorite)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart/bulk')
+    def shopping_cart_bulk(self, request):
+        return self.handle_bulk(request, ShoppingCart)
+
+    @action(detail=False,
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer],
             url_path='download_shopping_cart')
     def download_shopping_cart(self, request):
         user = request.user
-        
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_carts__user=user
+        renderer = request.accepted_renderer
+
+        ingredients = ShoppingCartIngredient.objects.filter(
+            user=user
         ).values(
             'ingredient__name',
             'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount')).order_by('ingredient__name')
-        
+        ).annotate(amount=F('total_amount')).order_by('ingredient__name')
+
         recipes = Recipe.objects.filter(
             shopping_carts__user=user
         ).select_related('author')
 
+        if isinstance(request._request, ASGIRequest):
+            # ASGIHandler читает потоковый ответ в цикле событий, где ORM
+            # недоступен, поэтому строки выбираются здесь, в потоке view
+            ingredients, recipes = list(ingredients), list(recipes)
+        else:
+            ingredients, recipes = ingredients.iterator(), recipes.iterator()
+
         current_date = datetime.now().strftime('%d.%m.%Y')
-        
-        shopping_list = '\n'.join([
-            f'Список покупок от {current_date}',
-            '',
-            'Продукты:',
-            *[f'{i}. {item["ingredient__name"].capitalize()} '
-              f'({item["ingredient__measurement_unit"]}) — {item["amount"]}'
-              for i, item in enumerate(ingredients, 1)],
-            '',
-            'Рецепты:',
-            *[f'• {recipe.name} (автор: {recipe.author.get_full_name() or recipe.author.username})'
-              for recipe in recipes],
-        ])
-
-        response = FileResponse(
-            BytesIO(shopping_list.encode('utf-8')),
-            content_type='text/plain',
-            filename='shopping_cart.txt'
+
+        response = StreamingHttpResponse(
+            SHOPPING_LIST_RENDERERS[renderer.format](
+                ingredients, recipes, current_date
+            ),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
         )
         return response
 
@@ -126,7 +346,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         get_object_or_404(Recipe, id=pk)
         
         short_url = request.build_absolute_uri(
-            reverse('recipe_redirect', args=[pk])
+            reverse('recipe_redirect', args=[short_links.encode(int(pk))])
         )
         
         return Response({'short-link': short_url})
@@ -135,7 +355,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
     permission_classes = (AllowAny,)
-    pagination_class = None
\ No newline at end of file
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        if (not request.query_params.get('name')
+                and request.accepted_media_type == JSONRenderer.media_type):
+            encoding = choose_encoding(
+                request.META.get('HTTP_ACCEPT_ENCODING', '')
+            )
+            handler = partial(self.catalogue_response, encoding)
+        else:
+            encoding = None
+            handler = partial(self.list_ingredients, request, *args, **kwargs)
+        etag = make_etag(
+            request, get_version(INGREDIENTS_VERSION_KEY), encoding
+        )
+        return conditional_response(
+            request, handler, etag, get_ingredients_modified()
+        )
+
+    def catalogue_response(self, encoding):
+        """Весь справочник из заранее сжатого снимка"""
+        response = HttpResponse(
+            ingredient_snapshot.get(encoding),
+            content_type=JSONRenderer.media_type
+        )
+        if encoding != IDENTITY:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def list_ingredients(self, request, *args, **kwargs):
+        """?name= отвечает индекс: сначала точные совпадения, затем
+        начинающиеся с запроса"""
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
\ No newline at end of file
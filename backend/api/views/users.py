@@ -1,4 +1,7 @@
-from django.shortcuts import get_object_or_404
+from collections import defaultdict
+
+from django.db.models import BooleanField, F, Value, Window
+from django.db.models.functions import RowNumber
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
@@ -8,6 +11,8 @@ from rest_framework.response import Response
 from ..serializers.users import (UserSerializer, SubscribedAuthorSerializer, 
                                 AvatarSerializer)
 from users.models import User, Subscription
+from recipes.models import Recipe
+from ..images import delete_variants
 from ..pagination import CustomPagination
 
 class UserViewSet(DjoserUserViewSet):
@@ -15,6 +20,38 @@ class UserViewSet(DjoserUserViewSet):
     serializer_class = UserSerializer
     pagination_class = CustomPagination
 
+    def attach_recipes(self, authors):
+        """Подгружает первые recipes_limit рецептов каждого автора
+        одним запросом с ROW_NUMBER() по автору."""
+        limit = self.request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.filter(
+            author__in=[author.id for author in authors]
+        )
+        if limit and limit.isdigit():
+            ranked = recipes.order_by().annotate(
+                recipe_rank=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=F('pub_date').desc()
+                )
+            ).values('id', 'author_id', 'name', 'image',
+                     'image_variants_key', 'cooking_time', 'pub_date',
+                     'recipe_rank')
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                f'WHERE recipe_rank <= %s '
+                f'ORDER BY author_id, recipe_rank',
+                (*params, int(limit))
+            )
+
+        recipes_by_author = defaultdict(list)
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.limited_recipes = recipes_by_author[author.id]
+        return authors
+
     @action(["get"], detail=False, permission_classes=[IsAuthenticated])
     def me(self, request, *args, **kwargs):
         return super().me(request, *args, **kwargs)
@@ -42,16 +79,21 @@ class UserViewSet(DjoserUserViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+            self.attach_recipes([author])
             serializer = SubscribedAuthorSerializer(
                 author, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        subscription = get_object_or_404(
-            Subscription, user=user, author=author,
-            message=f'Вы не подписаны на пользователя {author.username}'
-        )
-        subscription.delete()
+        deleted, _ = Subscription.objects.filter(
+            user=user, author=author
+        ).delete()
+        if not deleted:
+            return Response(
+                {'errors': 'Вы не подписаны на пользователя '
+                           f'{author.username}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, permission_classes=[IsAuthenticated])
@@ -59,9 +101,11 @@ class UserViewSet(DjoserUserViewSet):
         user = request.user
         subscriptions = User.objects.filter(
             subscribers__user=user
-        ).prefetch_related('subscribers')
-        
-        page = self.paginate_queryset(subscriptions)
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
+
+        page = self.attach_recipes(self.paginate_queryset(subscriptions))
         serializer = SubscribedAuthorSerializer(
             page, many=True, context={'request': request}
         )
@@ -83,7 +127,9 @@ class UserViewSet(DjoserUserViewSet):
         elif request.method == 'DELETE':
             user = request.user
             if user.avatar:
-                user.avatar.delete()
+                delete_variants(user.avatar_variants_key)
+                user.avatar.delete(save=False)
                 user.avatar = None
-                user.save()
+                user.avatar_variants_key = ''
+                user.save(update_fields=['avatar', 'avatar_variants_key'])
             return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -1,7 +1,25 @@
 import os
 
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+from .fast_paths import FastPathHandler  # noqa: E402 (после django.setup)
+
+fast_application = FastPathHandler()
+
+
+async def application(scope, receive, send):
+    if (scope['type'] == 'http' and settings.ASYNC_FAST_PATHS
+            and fast_application.matches(scope['path'])):
+        await fast_application(scope, receive, send)
+        return
+    # Синхронный код каждого запроса (ORM, синхронные представления) —
+    # в своём потоке, а не в одном общем на процесс, как делает
+    # ASGIHandler в Django 3.2
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
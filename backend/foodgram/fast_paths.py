@@ -0,0 +1,45 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import response_for_exception
+from django.urls import Resolver404, resolve
+
+from api.middleware import RequestTimingMiddleware
+
+FAST_URLCONF = 'foodgram.fast_urls'
+
+
+class FastPathHandler(ASGIHandler):
+    """ASGI-обработчик для асинхронных представлений из foodgram.fast_urls.
+
+    В Django 3.2 каждое middleware на MiddlewareMixin под ASGI
+    переключается в поток и обратно на каждом запросе; здесь цепочка —
+    только RequestTimingMiddleware, а хост проверяется явно, как это
+    делает CommonMiddleware. Сессии, CSRF и сообщения этим путям
+    не нужны: авторизация по токену.
+    """
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+        self._middleware_chain = RequestTimingMiddleware(self.dispatch)
+
+    @staticmethod
+    def matches(path):
+        try:
+            resolve(path, FAST_URLCONF)
+        except Resolver404:
+            return False
+        return True
+
+    async def dispatch(self, request):
+        try:
+            request.get_host()
+            request.resolver_match = match = resolve(
+                request.path_info, FAST_URLCONF
+            )
+            return await match.func(request, *match.args, **match.kwargs)
+        except Exception as exc:
+            return await sync_to_async(
+                response_for_exception, thread_sensitive=False
+            )(request, exc)
@@ -0,0 +1,22 @@
+from django.urls import path, register_converter
+
+from api.views import async_recipes
+from recipes.short_links import ShortCodeConverter
+from recipes.views import redirect_recipe_async
+
+register_converter(ShortCodeConverter, 'short_code')
+
+# Пути, которые под ASGI обслуживает foodgram.fast_paths; имена те же,
+# что у синхронных представлений, для метрик
+urlpatterns = [
+    path('api/recipes/<int:pk>/favorite/', async_recipes.favorite,
+         name='recipes-favorite'),
+    path('api/recipes/<int:pk>/shopping_cart/', async_recipes.shopping_cart,
+         name='recipes-shopping-cart'),
+    path('api/recipes/<int:pk>/get-link/', async_recipes.get_link,
+         name='recipes-get-link'),
+    path('s/<short_code:code>/', redirect_recipe_async,
+         name='recipe_redirect'),
+    path('s/<int:recipe_id>/', redirect_recipe_async,
+         name='recipe_redirect_by_id'),
+]
@@ -27,6 +27,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,6 +61,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Схема тестовой базы строится по текущим моделям, без миграций
+        'TEST': {'MIGRATE': False},
     }
 }
 
@@ -103,11 +106,15 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 
 }
 
@@ -166,4 +173,75 @@ LOGGING = {
             'propagate': True,
         },
     },
-}
\ No newline at end of file
+}
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 60 * 5))
+
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+INGREDIENTS_FILE_PATH = os.getenv(
+    'INGREDIENTS_FILE_PATH', '/app/data/ingredients.json'
+)
+
+BULK_RECIPES_MAX_BATCH = int(os.getenv('BULK_RECIPES_MAX_BATCH', 100))
+
+# Фильтр ?ingredients= через индекс в памяти; False — запросом к БД
+RECIPE_INGREDIENT_INDEX = os.getenv(
+    'RECIPE_INGREDIENT_INDEX', 'True'
+).lower() in ('true', '1', 'yes')
+
+# Рецепты авторов с большим числом подписчиков не раскладываются
+# по лентам при публикации, а подмешиваются при чтении ленты. Автор
+# переключается командой update_feed_fanout: в «популярные» — когда
+# подписчиков больше MAX, обратно — когда их не больше MIN
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv('FEED_FANOUT_MAX_SUBSCRIBERS', 1000)
+)
+FEED_FANOUT_MIN_SUBSCRIBERS = int(os.getenv(
+    'FEED_FANOUT_MIN_SUBSCRIBERS', FEED_FANOUT_MAX_SUBSCRIBERS * 4 // 5
+))
+# Сколько последних рецептов автора попадает в ленту при подписке
+# и при переключении автора на раскладку
+FEED_WINDOW = int(os.getenv('FEED_WINDOW', 500))
+
+# Выдача списка и карточки рецепта из .values() без сериализаторов
+FAST_READ_PATH = os.getenv('FAST_READ_PATH', 'True').lower() in (
+    'true', '1', 'yes'
+)
+
+# /api/metrics/ суммирует метрики всех процессов через общий кэш: каждый
+# публикует свои раз в METRICS_FLUSH_INTERVAL секунд, снимок процесса
+# живёт METRICS_PROCESS_TIMEOUT секунд после последней публикации
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_PROCESS_TIMEOUT = int(os.getenv('METRICS_PROCESS_TIMEOUT', 60 * 60))
+
+# Кэш аутентификации по токену: общий уровень и LRU в памяти процесса.
+# Для отзыва токенов во всех процессах CACHE_BACKEND должен быть общим
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 60 * 5))
+TOKEN_CACHE_LOCAL_TIMEOUT = int(os.getenv('TOKEN_CACHE_LOCAL_TIMEOUT', 30))
+TOKEN_CACHE_LOCAL_SIZE = int(os.getenv('TOKEN_CACHE_LOCAL_SIZE', 1024))
+
+# Под ASGI (uvicorn foodgram.asgi:application) избранное, корзину,
+# get-link и редирект по короткой ссылке обслуживают асинхронные
+# представления (foodgram.fast_paths); запросы к базе из них выполняет
+# пул из ASYNC_DB_THREADS потоков
+ASYNC_FAST_PATHS = os.getenv('ASYNC_FAST_PATHS', 'True').lower() in (
+    'true', '1', 'yes'
+)
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 8))
+
+# Ключ перестановки id рецептов в коды коротких ссылок (recipes.short_links);
+# после смены ранее выданные ссылки перестают открываться
+SHORT_LINK_SALT = os.getenv('SHORT_LINK_SALT', 'foodgram')
+# Раз в сколько секунд асинхронный редирект сверяет индекс рецептов с кэшем
+SHORT_LINK_REFRESH_INTERVAL = float(
+    os.getenv('SHORT_LINK_REFRESH_INTERVAL', 1)
+)
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.db.models import Count
 from django.utils.safestring import mark_safe
 
+from . import cart_totals
 from .models import (
     Favorite,
     Ingredient,
@@ -37,21 +38,21 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'get_favorites_count', 'display_ingredients', 'display_image')
+    list_display = ('id', 'name', 'author', 'favorites_count',
+                    'display_ingredients', 'display_image')
     search_fields = ('name', 'author__username', 'author__email')
     list_filter = ('author', 'pub_date')
     inlines = (RecipeIngredientInline,)
-    readonly_fields = ('pub_date', 'display_image')
+    readonly_fields = ('pub_date', 'favorites_count', 'display_image')
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.select_related('author').annotate(
-            favorites_count=Count('favorites')
-        )
+        return queryset.select_related('author')
 
-    @admin.display(description='В избранном', ordering='favorites_count')
-    def get_favorites_count(self, obj):
-        return obj.favorites_count
+    def save_related(self, request, form, formsets, change):
+        old_amounts = cart_totals.recipe_amounts(form.instance.pk)
+        super().save_related(request, form, formsets, change)
+        cart_totals.update_recipe(form.instance.pk, old_amounts)
     
     @admin.display(description='Ингредиенты')
     def display_ingredients(self, obj):
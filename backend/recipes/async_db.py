@@ -0,0 +1,57 @@
+"""Обращения к базе из асинхронных представлений.
+
+В Django 3.2 нет асинхронного ORM, а sync_to_async(thread_sensitive=True)
+под ASGI выполняет синхронный код всех запросов процесса в одном потоке.
+database_sync_to_async (как в channels) отдаёт вызов фиксированному пулу
+из ASYNC_DB_THREADS потоков со своими соединениями; устаревшие
+соединения закрываются по CONN_MAX_AGE до и после вызова.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+# execute_wrapper'ы текущего запроса (см. api.middleware): ставятся на
+# соединение потока пула на время вызова
+query_wrappers = ContextVar('query_wrappers', default=())
+
+executor = None
+executor_lock = Lock()
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        with executor_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_DB_THREADS,
+                    thread_name_prefix='async-db'
+                )
+    return executor
+
+
+def database_sync_to_async(func):
+    @wraps(func)
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            with ExitStack() as stack:
+                for wrapper in query_wrappers.get():
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    @wraps(func)
+    async def run(*args, **kwargs):
+        return await sync_to_async(
+            call, thread_sensitive=False, executor=get_executor()
+        )(*args, **kwargs)
+
+    return run
@@ -0,0 +1,114 @@
+"""Поддержка сводной таблицы ShoppingCartIngredient.
+
+Все функции выполняют фиксированное число запросов независимо от
+количества ингредиентов и должны вызываться внутри транзакции,
+в которой меняется корзина или состав рецепта.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingCartIngredient
+
+
+def recipe_amounts(recipe_id):
+    """{ingredient_id: amount} для рецепта"""
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount'))
+
+
+def apply_deltas(user_ids, deltas):
+    """Прибавляет к сводным строкам пользователей изменения
+    {ingredient_id: (amount_delta, recipe_count_delta)}."""
+    if not user_ids or not deltas:
+        return
+    # Строки пользователей блокируются раньше сводных строк и всегда в
+    # порядке id: без этого две параллельные корзины с общим новым
+    # ингредиентом обе не найдут строку и обе попробуют её создать
+    list(get_user_model().objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk'))
+    rows = {
+        (row.user_id, row.ingredient_id): row
+        for row in ShoppingCartIngredient.objects.select_for_update().filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, (amount, count) in deltas.items():
+            row = rows.get((user_id, ingredient_id))
+            if row is None:
+                if count > 0:
+                    to_create.append(ShoppingCartIngredient(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        total_amount=max(amount, 0), recipe_count=count
+                    ))
+                continue
+            row.total_amount = max(row.total_amount + amount, 0)
+            row.recipe_count = max(row.recipe_count + count, 0)
+            if row.recipe_count:
+                to_update.append(row)
+            else:
+                to_delete.append(row.pk)
+
+    ShoppingCartIngredient.objects.bulk_create(to_create)
+    ShoppingCartIngredient.objects.bulk_update(
+        to_update, ['total_amount', 'recipe_count']
+    )
+    if to_delete:
+        ShoppingCartIngredient.objects.filter(pk__in=to_delete).delete()
+
+
+def add_recipes(user_ids, recipe_ids, sign=1):
+    """Добавляет (sign=1) или убирает (sign=-1) рецепты из сводных
+    списков пользователей"""
+    deltas = {}
+    for ingredient_id, amount in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('ingredient_id', 'amount'):
+        total, count = deltas.get(ingredient_id, (0, 0))
+        deltas[ingredient_id] = (total + sign * amount, count + sign)
+    apply_deltas(user_ids, deltas)
+
+
+def add_recipe(user_ids, recipe_id):
+    add_recipes(user_ids, [recipe_id])
+
+
+def remove_recipe(user_ids, recipe_id):
+    add_recipes(user_ids, [recipe_id], sign=-1)
+
+
+def update_recipe(recipe_id, old_amounts, new_amounts=None):
+    """Переносит изменение состава рецепта в корзины, где он лежит"""
+    if new_amounts is None:
+        new_amounts = recipe_amounts(recipe_id)
+    deltas = {}
+    for ingredient_id in old_amounts.keys() | new_amounts.keys():
+        old = old_amounts.get(ingredient_id)
+        new = new_amounts.get(ingredient_id)
+        if old == new:
+            continue
+        deltas[ingredient_id] = (
+            (new or 0) - (old or 0),
+            (new is not None) - (old is not None)
+        )
+    if deltas:
+        apply_deltas(list(ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)), deltas)
+
+
+def expected_totals(user_ids):
+    """Эталонные суммы по join-запросу: {(user_id, ingredient_id):
+    (total_amount, recipe_count)}"""
+    return {
+        (row['recipe__shopping_carts__user'], row['ingredient']):
+        (row['total'], row['count'])
+        for row in RecipeIngredient.objects.filter(
+            recipe__shopping_carts__user__in=user_ids
+        ).values(
+            'recipe__shopping_carts__user', 'ingredient'
+        ).annotate(total=Sum('amount'), count=Count('id')).order_by()
+    }
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.images import generate_variants, save_variants_key
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии изображений рецептов и аватаров'
+
+    def handle(self, *args, **options):
+        sources = [
+            (Recipe, 'image', pk, name)
+            for pk, name in Recipe.objects.exclude(
+                image=''
+            ).values_list('pk', 'image')
+        ] + [
+            (User, 'avatar', pk, name)
+            for pk, name in User.objects.exclude(avatar='').exclude(
+                avatar__isnull=True
+            ).values_list('pk', 'avatar')
+        ]
+        failed = 0
+        for model, field, pk, name in sources:
+            try:
+                key = generate_variants(name)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'{name}: {e}')
+                continue
+            # Сигналы save() сбросят кэши выдачи и токенов
+            save_variants_key(model, pk, field, name, key)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {len(sources) - failed}, '
+            f'ошибок: {failed}'
+        ))
@@ -1,35 +1,173 @@
+import csv
 import json
 import os
+from itertools import islice
+
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction, IntegrityError
-from recipes.models import Ingredient
-from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from recipes.models import Ingredient, Recipe
+from recipes.versions import bump_ingredients
+
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def iter_json(file, chunk_size=64 * 1024):
+    """Потоково читает JSON-массив объектов, не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def skip(chars):
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            buffer, pos = file.read(chunk_size), 0
+            eof = not buffer
+
+    skip(' \t\r\n')
+    if eof or buffer[pos] != '[':
+        raise ValueError('Ожидается JSON-массив объектов')
+    pos += 1
+    while True:
+        skip(' \t\r\n,')
+        if eof:
+            raise ValueError('Неожиданный конец JSON-файла')
+        if buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if not row or row == ['name', 'measurement_unit']:
+            continue
+        yield {
+            'name': row[0],
+            'measurement_unit': row[1] if len(row) > 1 else ''
+        }
+
+
+READERS = {
+    'json': iter_json,
+    'csv': iter_csv,
+}
 
 
 class Command(BaseCommand):
-    help = 'Импортирует ингредиенты из JSON-файла с оптимизацией для большого объема данных'
+    help = ('Импортирует ингредиенты из JSON- или CSV-файла: потоково, '
+            'пакетами, с обновлением единиц измерения существующих записей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=settings.INGREDIENTS_FILE_PATH,
+            help='Путь к файлу (по умолчанию INGREDIENTS_FILE_PATH)'
+        )
+        parser.add_argument(
+            '--format', choices=READERS, dest='file_format',
+            help='Формат файла; по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество записей в одном пакете'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только подсчитать изменения, не записывая их в базу'
+        )
 
     def handle(self, *args, **options):
+        file_path = options['path']
+        file_format = (options['file_format']
+                       or os.path.splitext(file_path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {file_path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        self.dry_run = options['dry_run']
+        self.stats = {'created': 0, 'updated': 0, 'skipped': 0}
+
+        self.stdout.write(f'Загрузка данных из файла {file_path}...')
         try:
-            file_path = '/app/data/ingredients.json'
-            
-            self.stdout.write(f'Загрузка данных из файла {file_path}...')
-            
-            existing = {(item['name'], item['measurement_unit']): True 
-                      for item in Ingredient.objects.all().values('name', 'measurement_unit')}
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                result = Ingredient.objects.bulk_create([
-                    Ingredient(**ingredient) 
-                    for ingredient in json.load(f)
-                    if (ingredient['name'], ingredient['measurement_unit']) not in existing], 
-                    ignore_conflicts=True)
-            
-            created_count = len(result)
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'Успешно импортировано {created_count} новых ингредиентов')
+            with open(file_path, 'r', encoding='utf-8', newline='') as f:
+                rows = READERS[file_format](f)
+                processed = 0
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    self.import_batch(batch)
+                    processed += len(batch)
+                    self.stdout.write(f'\rОбработано записей: {processed}',
+                                      ending='')
+                    self.stdout.flush()
+        except (OSError, ValueError, csv.Error) as e:
+            raise CommandError(
+                f'Ошибка при импорте ингредиентов из файла {file_path}: {e}'
             )
-        except Exception as e:
-            raise CommandError(f'Ошибка при импорте ингредиентов из файла {file_path}: {e}')
\ No newline at end of file
+        self.stdout.write('')
+
+        if not self.dry_run and (self.stats['created']
+                                 or self.stats['updated']):
+            bump_ingredients()
+
+        prefix = 'Пробный запуск: ' if self.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}создано {self.stats["created"]}, '
+            f'обновлено {self.stats["updated"]}, '
+            f'пропущено {self.stats["skipped"]}'
+        ))
+
+    def import_batch(self, batch):
+        incoming = {}
+        for item in batch:
+            name = str(item.get('name') or '').strip()
+            unit = str(item.get('measurement_unit') or '').strip()
+            if (not name or not unit or name in incoming
+                    or len(name) > NAME_MAX_LENGTH
+                    or len(unit) > UNIT_MAX_LENGTH):
+                self.stats['skipped'] += 1
+                continue
+            incoming[name] = unit
+
+        existing = {}
+        for ingredient in Ingredient.objects.filter(name__in=incoming):
+            existing.setdefault(ingredient.name, []).append(ingredient)
+
+        to_create, to_update = [], []
+        for name, unit in incoming.items():
+            matches = existing.get(name, [])
+            if any(ingredient.measurement_unit == unit
+                   for ingredient in matches):
+                self.stats['skipped'] += 1
+            elif len(matches) == 1:
+                matches[0].measurement_unit = unit
+                to_update.append(matches[0])
+            else:
+                to_create.append(Ingredient(name=name, measurement_unit=unit))
+
+        self.stats['created'] += len(to_create)
+        self.stats['updated'] += len(to_update)
+        if self.dry_run:
+            return
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(to_create, ignore_conflicts=True)
+            Ingredient.objects.bulk_update(to_update, ['measurement_unit'])
+            if to_update:
+                # Единица измерения входит в выдачу рецептов
+                Recipe.objects.filter(
+                    recipe_ingredients__ingredient__in=to_update
+                ).update(updated_at=timezone.now())
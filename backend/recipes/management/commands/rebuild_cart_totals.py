@@ -0,0 +1,77 @@
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.cart_totals import expected_totals
+from recipes.models import ShoppingCartIngredient
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сверяет сводные списки покупок с корзинами пользователей '
+            'и перестраивает расходящиеся')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, не исправляя расхождения'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Количество пользователей в одном пакете'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = User.objects.order_by('id').values_list(
+            'id', flat=True
+        ).iterator()
+        checked = drifted = 0
+        while True:
+            batch = list(islice(user_ids, options['batch_size']))
+            if not batch:
+                break
+            checked += len(batch)
+            drifted += self.process_batch(batch, options['check'])
+
+        message = (f'Проверено пользователей: {checked}, '
+                   f'с расхождениями: {drifted}')
+        if drifted and options['check']:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def process_batch(self, user_ids, check_only):
+        with transaction.atomic():
+            expected = expected_totals(user_ids)
+            stored = {
+                (user_id, ingredient_id): (total, count)
+                for user_id, ingredient_id, total, count in
+                ShoppingCartIngredient.objects.select_for_update().filter(
+                    user_id__in=user_ids
+                ).values_list(
+                    'user_id', 'ingredient_id', 'total_amount', 'recipe_count'
+                )
+            }
+            drifted = {
+                user_id for user_id, ingredient_id
+                in expected.keys() | stored.keys()
+                if expected.get((user_id, ingredient_id))
+                != stored.get((user_id, ingredient_id))
+            }
+            if drifted and not check_only:
+                ShoppingCartIngredient.objects.filter(
+                    user_id__in=drifted
+                ).delete()
+                ShoppingCartIngredient.objects.bulk_create(
+                    ShoppingCartIngredient(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        total_amount=total, recipe_count=count
+                    )
+                    for (user_id, ingredient_id), (total, count)
+                    in expected.items()
+                    if user_id in drifted
+                )
+        return len(drifted)
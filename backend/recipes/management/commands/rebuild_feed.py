@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import feed
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает ленты подписок по текущим подпискам и рецептам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество записей ленты в одном INSERT'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            feed.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}'
+        ))
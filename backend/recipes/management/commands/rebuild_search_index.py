@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from recipes import search
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='База данных, в которой перестраивается индекс'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.stdout.write(self.style.WARNING(
+                f'Полнотекстовый индекс для {connection.vendor} '
+                'не поддерживается, поиск работает через icontains'
+            ))
+            return
+        search.rebuild(connection)
+        total = Recipe.objects.using(options['database']).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс поиска перестроен, рецептов: {total}'
+        ))
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def count_by(model, field):
+    """Подзапрос: число строк model, ссылающихся на текущую запись"""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscriptions_count', Subscription, 'user'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает хранимые счётчики (избранное, рецепты, подписки) '
+            'и сообщает о расхождениях')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, не исправляя их'
+        )
+
+    def handle(self, *args, **options):
+        total_drift = 0
+        for model, counter, related_model, field in COUNTERS:
+            actual = count_by(related_model, field)
+            with transaction.atomic():
+                drifted = model.objects.annotate(actual=actual).exclude(
+                    **{counter: F('actual')}
+                )
+                drift = drifted.count()
+                if drift and not options['dry_run']:
+                    model.objects.filter(
+                        pk__in=drifted.values('pk')
+                    ).update(**{counter: actual})
+            total_drift += drift
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{counter}: '
+                f'расхождений {drift}'
+            )
+
+        if options['dry_run'] or not total_drift:
+            self.stdout.write(self.style.SUCCESS(
+                f'Всего расхождений: {total_drift}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено расхождений: {total_drift}'
+            ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from recipes import feed
+
+
+class Command(BaseCommand):
+    help = ('Переключает авторов между раскладкой рецептов по лентам и '
+            'чтением при запросе ленты по числу подписчиков; запускается '
+            'периодически, например из cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество записей ленты в одном INSERT'
+        )
+
+    def handle(self, *args, **options):
+        popular, regular = feed.update_fanout(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Стали популярными: {popular}, снова раскладываются: {regular}'
+        ))
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from recipes import search
+    search.install(schema_editor.connection)
+    search.rebuild(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from recipes import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Ключ уменьшенных копий изображения'),
+        ),
+    ]
@@ -49,6 +49,13 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         blank=False
     )
+    image_variants_key = models.CharField(
+        verbose_name='Ключ уменьшенных копий изображения',
+        max_length=64,
+        blank=True,
+        default='',
+        editable=False
+    )
     text = models.TextField(
         verbose_name='Описание рецепта',
         blank=False 
@@ -67,12 +74,27 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -160,4 +182,93 @@ class ShoppingCart(models.Model):
         ]
 
     def __str__(self):
-        return f'{self.user.username} - {self.recipe.name}'
\ No newline at end of file
+        return f'{self.user.username} - {self.recipe.name}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Сводный список покупок пользователя: суммарное количество
+    каждого ингредиента по всем рецептам из корзины.
+
+    Поддерживается в актуальном состоянии при изменении корзины
+    и состава рецептов (см. recipes.cart_totals).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество'
+    )
+    recipe_count = models.PositiveIntegerField(
+        verbose_name='Рецептов'
+    )
+
+    class Meta:
+        verbose_name = 'Продукт в списке покупок'
+        verbose_name_plural = 'Продукты в списках покупок'
+        default_related_name = 'cart_ingredients'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.ingredient.name}'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь.
+
+    Заполняется при публикации рецепта (fan-out on write) только для
+    авторов с небольшим числом подписчиков; рецепты остальных авторов
+    подмешиваются в ленту при чтении (см. recipes.feed).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe.name}'
@@ -0,0 +1,152 @@
+"""Полнотекстовый поиск рецептов по названию и описанию.
+
+Индекс живёт рядом с таблицей рецептов и синхронизируется самой базой:
+
+- SQLite: внешняя FTS5-таблица recipes_recipe_fts и триггеры на
+  вставку/изменение/удаление рецепта. Русского стеммера в FTS5 нет,
+  поэтому окончания слов запроса отбрасываются и ищется префикс;
+- PostgreSQL: генерируемая колонка search_vector (tsvector со словарём
+  russian, название весомее описания) и GIN-индекс по ней.
+
+Результаты ранжируются: bm25 в SQLite, ts_rank в PostgreSQL.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+TABLE = Recipe._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+PG_INDEX = f'{TABLE}_search_idx'
+
+# Вес совпадения в названии относительно описания
+NAME_WEIGHT = 10.0
+
+SQLITE_SETUP = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"name, text, content='{TABLE}', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}(rowid, name, text) "
+    f"VALUES (new.id, new.name, new.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text) "
+    f"VALUES ('delete', old.id, old.name, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au "
+    f"AFTER UPDATE OF name, text ON {TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text) "
+    f"VALUES ('delete', old.id, old.name, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, text) "
+    f"VALUES (new.id, new.name, new.text); END",
+)
+SQLITE_TEARDOWN = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+POSTGRES_SETUP = (
+    f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    f") STORED",
+    f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {TABLE} '
+    f'USING GIN (search_vector)',
+)
+POSTGRES_TEARDOWN = (
+    f'DROP INDEX IF EXISTS {PG_INDEX}',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+)
+
+# Окончания, которые отбрасываются у слов запроса в SQLite
+RUSSIAN_ENDING = re.compile(r'[аеёиоуыэюяйь]{1,2}$')
+
+
+def install(conn=connection):
+    """Создаёт индекс и триггеры, если их ещё нет.
+
+    Вызывается миграцией и после каждого migrate: при пересоздании
+    таблицы рецептов SQLite удаляет её триггеры.
+    """
+    statements = {
+        'sqlite': SQLITE_SETUP, 'postgresql': POSTGRES_SETUP
+    }.get(conn.vendor, ())
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall(conn=connection):
+    statements = {
+        'sqlite': SQLITE_TEARDOWN, 'postgresql': POSTGRES_TEARDOWN
+    }.get(conn.vendor, ())
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def rebuild(conn=connection):
+    """Переиндексирует всю таблицу рецептов"""
+    install(conn)
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+            )
+        elif conn.vendor == 'postgresql':
+            cursor.execute(f'REINDEX INDEX {PG_INDEX}')
+
+
+def stem(word):
+    if len(word) > 4:
+        return RUSSIAN_ENDING.sub('', word)
+    return word
+
+
+def fts5_query(query):
+    """Запрос пользователя -> выражение FTS5: все слова, по префиксу"""
+    return ' '.join(
+        f'"{stem(word)}"*' for word in re.findall(r'\w+', query.casefold())
+    )
+
+
+def search(queryset, query):
+    """Отбирает рецепты, подходящие под запрос, и сортирует их
+    по релевантности (аннотация search_rank)"""
+    if connection.vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset.none()
+        matched = RawSQL(
+            f'{TABLE}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)',
+            (match,), output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, {NAME_WEIGHT}, 1.0) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = {TABLE}.id)',
+            (match,), output_field=FloatField()
+        )
+    elif connection.vendor == 'postgresql':
+        matched = RawSQL(
+            f"{TABLE}.search_vector @@ websearch_to_tsquery('russian', %s)",
+            (query,), output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f"ts_rank({TABLE}.search_vector, "
+            f"websearch_to_tsquery('russian', %s))",
+            (query,), output_field=FloatField()
+        )
+    else:
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        )
+    return queryset.filter(matched).annotate(
+        search_rank=rank
+    ).order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,177 @@
+"""Короткие ссылки на рецепты: коды из 7 символов base62 вместо id и
+индекс живых рецептов в памяти процесса, чтобы редирект по ссылке
+обходился без запроса к базе.
+
+Код — это id, переставленный обратимым аффинным преобразованием по
+модулю 2**41 (ключ — SHORT_LINK_SALT), поэтому соседние рецепты
+получают непохожие коды, а по коду не видно число рецептов.
+"""
+import logging
+import string
+import time
+from hashlib import sha256
+from threading import Lock
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .async_db import get_executor
+from .models import Recipe
+from .versions import RECIPES_VERSION_KEY, get_changed_recipes, get_version
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_LENGTH = 7
+CODE_SPACE = 2 ** 41  # 62 ** 7 > 2 ** 41: любой код — ровно 7 символов
+DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+
+# Если процесс отстал больше чем на столько версий, индекс дешевле
+# перестроить целиком, чем читать журнал изменений.
+MAX_JOURNAL_GAP = 500
+
+_digest = sha256(settings.SHORT_LINK_SALT.encode()).digest()
+MULTIPLIER = int.from_bytes(_digest[:8], 'big') % CODE_SPACE | 1
+OFFSET = int.from_bytes(_digest[8:16], 'big') % CODE_SPACE
+INVERSE = pow(MULTIPLIER, -1, CODE_SPACE)
+
+
+def encode(recipe_id):
+    value = (recipe_id * MULTIPLIER + OFFSET) % CODE_SPACE
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(code):
+    """id рецепта по коду или None, если код не может быть выдан encode"""
+    if len(code) != CODE_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        digit = DIGITS.get(char)
+        if digit is None:
+            return None
+        value = value * len(ALPHABET) + digit
+    if value >= CODE_SPACE:
+        return None
+    return (value - OFFSET) * INVERSE % CODE_SPACE or None
+
+
+class ShortCodeConverter:
+    regex = f'[0-9A-Za-z]{{{CODE_LENGTH}}}'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+class LiveRecipeIndex:
+    """Битовая карта id существующих рецептов.
+
+    В процессе, который создал или удалил рецепт, обновляется сразу
+    сигналами (recipes.signals), в остальных — точечно по журналу
+    изменённых рецептов (recipes.versions.bump_recipes): проверка версии
+    стоит одного обращения к кэшу, база читается только после изменений.
+    Асинхронный код проверяет версию в фоне (refresh_in_background).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.bits = bytearray()
+        self.lock = Lock()
+        self.refreshing = False
+        self.next_check = 0
+
+    def set(self, recipe_id, alive):
+        byte, bit = divmod(recipe_id, 8)
+        if byte >= len(self.bits):
+            if not alive:
+                return
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if alive:
+            self.bits[byte] |= 1 << bit
+        else:
+            self.bits[byte] &= ~(1 << bit)
+
+    def build(self, version):
+        bits = bytearray()
+        for recipe_id in Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).iterator():
+            byte, bit = divmod(recipe_id, 8)
+            if not bits:
+                bits = bytearray(byte + 1)
+            bits[byte] |= 1 << bit
+        self.bits = bits
+        self.version = version
+
+    def update(self, recipe_ids, version):
+        alive = set(Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('id', flat=True))
+        for recipe_id in recipe_ids:
+            self.set(recipe_id, recipe_id in alive)
+        self.version = version
+
+    def refresh(self):
+        version = get_version(RECIPES_VERSION_KEY)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            changed = None
+            if (self.version is not None
+                    and 0 < version - self.version <= MAX_JOURNAL_GAP):
+                changed = get_changed_recipes(self.version, version)
+            if changed is None:
+                self.build(version)
+            else:
+                self.update(changed, version)
+
+    def refresh_in_background(self):
+        """Для цикла событий: проверка версии уходит в пул потоков базы
+        не чаще раза в SHORT_LINK_REFRESH_INTERVAL секунд, и запрос её
+        не ждёт. Удаление рецепта в другом процессе становится заметно
+        с этой задержкой."""
+        now = time.monotonic()
+        if self.refreshing or now < self.next_check:
+            return
+        self.refreshing = True
+        self.next_check = now + settings.SHORT_LINK_REFRESH_INTERVAL
+        get_executor().submit(self.refresh_detached)
+
+    def refresh_detached(self):
+        close_old_connections()
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('Не удалось обновить индекс рецептов')
+        finally:
+            self.refreshing = False
+            close_old_connections()
+
+    def has(self, recipe_id):
+        """Без обновления: для асинхронного кода после refresh()"""
+        byte, bit = divmod(recipe_id, 8)
+        return byte < len(self.bits) and bool(self.bits[byte] >> bit & 1)
+
+    def __contains__(self, recipe_id):
+        self.refresh()
+        return self.has(recipe_id)
+
+    def add(self, recipe_id):
+        with self.lock:
+            self.set(recipe_id, True)
+
+    def discard(self, recipe_id):
+        with self.lock:
+            self.set(recipe_id, False)
+
+
+live_recipes = LiveRecipeIndex()
@@ -0,0 +1,148 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Subscription
+from . import cart_totals, feed, search
+from .short_links import live_recipes
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart)
+from .versions import (bump_ingredients, bump_recipes, bump_version,
+                       touch_recipes, user_state_key)
+
+User = get_user_model()
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    """Индекс поиска для баз без миграций (run_syncdb) и восстановление
+    триггеров после пересоздания таблицы рецептов в SQLite"""
+    if sender.name == 'recipes':
+        search.install(connections[using])
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    transaction.on_commit(bump_ingredients)
+
+
+@receiver([post_save, pre_delete], sender=Ingredient)
+def ingredient_touched(sender, instance, created=False, **kwargs):
+    """Название и единица измерения входят в выдачу рецептов"""
+    if not created:
+        Recipe.objects.filter(
+            recipe_ingredients__ingredient=instance
+        ).update(updated_at=timezone.now())
+
+
+def bump_user_state(user_id):
+    transaction.on_commit(partial(bump_version, user_state_key(user_id)))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_recipes, instance.pk))
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_recipes, instance.recipe_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+def author_changed(sender, instance, created=False, update_fields=None,
+                   **kwargs):
+    """Карточка автора входит в выдачу его рецептов"""
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    recipe_ids = list(instance.recipes.values_list('id', flat=True))
+    transaction.on_commit(partial(touch_recipes, *recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+        feed.publish(instance)
+        transaction.on_commit(partial(live_recipes.add, instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=F('recipes_count') - 1
+    )
+    transaction.on_commit(partial(live_recipes.discard, instance.pk))
+
+
+bulk_counters = ContextVar('bulk_counters', default=False)
+
+
+@contextmanager
+def counted_in_bulk():
+    """Удаления из избранного и корзины внутри блока не трогают счётчики
+    и версию состояния: их одним запросом на пачку обновляет вызывающий"""
+    token = bulk_counters.set(True)
+    try:
+        yield
+    finally:
+        bulk_counters.reset(token)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        bump_user_state(instance.user_id)
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    if bulk_counters.get():
+        return
+    bump_user_state(instance.user_id)
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        favorites_count=F('favorites_count') - 1
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_created(sender, instance, created, **kwargs):
+    if created:
+        bump_user_state(instance.user_id)
+        cart_totals.add_recipe([instance.user_id], instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    """pre_delete: при каскадном удалении рецепта его ингредиенты
+    ещё не удалены"""
+    if bulk_counters.get():
+        return
+    bump_user_state(instance.user_id)
+    cart_totals.remove_recipe([instance.user_id], instance.recipe_id)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        bump_user_state(instance.user_id)
+        feed.subscribe(instance)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    bump_user_state(instance.user_id)
+    feed.unsubscribe(instance)
@@ -1,7 +1,14 @@
-from django.urls import path
+from django.urls import path, register_converter
 from . import views
+from .short_links import ShortCodeConverter
 
-urlpatterns = [
-    path('<int:recipe_id>/', views.redirect_recipe, name='recipe_redirect'),
+register_converter(ShortCodeConverter, 'short_code')
 
-]
\ No newline at end of file
+# Код короткой ссылки проверяется первым: ссылки по id из семи цифр,
+# выданные до появления кодов, не открываются
+urlpatterns = [
+    path('<short_code:code>/', views.redirect_recipe,
+         name='recipe_redirect'),
+    path('<int:recipe_id>/', views.redirect_recipe,
+         name='recipe_redirect_by_id'),
+]
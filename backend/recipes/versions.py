@@ -0,0 +1,92 @@
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+INGREDIENTS_VERSION_KEY = 'versions:ingredients'
+INGREDIENTS_MODIFIED_KEY = 'versions:ingredients:modified'
+RECIPES_VERSION_KEY = 'versions:recipes'
+# Журнал изменений: какие рецепты затронуло каждое повышение версии
+# RECIPES_VERSION_KEY. По нему индексы в памяти процессов обновляются
+# точечно, без полной перестройки.
+RECIPES_JOURNAL_TIMEOUT = 60 * 60
+
+
+def recipe_version_key(recipe_id):
+    return f'versions:recipe:{recipe_id}'
+
+
+def user_state_key(user_id):
+    """Избранное, корзина и подписки пользователя: от них зависят
+    is_favorited, is_in_shopping_cart и is_subscribed в его выдаче"""
+    return f'versions:user:{user_id}'
+
+
+def initial_version():
+    """Начальное значение счётчика: после вытеснения ключа из кэша
+    версия не откатится к уже выданному значению."""
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial_version(), timeout=None)
+        return cache.get(key)
+
+
+def recipes_journal_key(version):
+    return f'versions:recipes:changes:{version}'
+
+
+def get_changed_recipes(since, version):
+    """Рецепты, изменённые в версиях (since, version], или None,
+    если часть журнала уже вытеснена из кэша"""
+    keys = [recipes_journal_key(v) for v in range(since + 1, version + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) != len(keys):
+        return None
+    return {recipe_id for ids in entries.values() for recipe_id in ids}
+
+
+def bump_recipes(*recipe_ids):
+    """Сбрасывает кэш ленты и выдачи перечисленных рецептов"""
+    version = bump_version(RECIPES_VERSION_KEY)
+    cache.set(recipes_journal_key(version), recipe_ids,
+              timeout=RECIPES_JOURNAL_TIMEOUT)
+    for recipe_id in recipe_ids:
+        bump_version(recipe_version_key(recipe_id))
+
+
+def bump_ingredients():
+    """Справочник ингредиентов изменился"""
+    bump_version(INGREDIENTS_VERSION_KEY)
+    cache.set(INGREDIENTS_MODIFIED_KEY, int(time.time()), timeout=None)
+
+
+def get_ingredients_modified():
+    """Время последнего изменения справочника (unix time). Если отметка
+    вытеснена из кэша, считается, что справочник изменился сейчас."""
+    cache.add(INGREDIENTS_MODIFIED_KEY, int(time.time()), timeout=None)
+    return cache.get(INGREDIENTS_MODIFIED_KEY)
+
+
+def touch_recipes(*recipe_ids):
+    """Выдача рецептов изменилась без сохранения самих рецептов (автор,
+    ингредиенты, готовые копии изображений): двигает updated_at
+    и сбрасывает кэш"""
+    from .models import Recipe
+
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    bump_recipes(*recipe_ids)
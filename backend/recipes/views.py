@@ -1,9 +1,33 @@
 from django.shortcuts import redirect
 from django.http import Http404
-from .models import Recipe
+from .async_db import database_sync_to_async
+from .short_links import decode, live_recipes
 
-def redirect_recipe(request, recipe_id):
-    if not Recipe.objects.filter(id=recipe_id).exists():
-        raise Http404(f"Рецепт с ID {recipe_id} не найден")
-    
-    return redirect(f'/recipes/{recipe_id}/')
\ No newline at end of file
+
+def redirect_recipe(request, code=None, recipe_id=None):
+    """Редирект по короткой ссылке: код из get-link или, для ссылок,
+    выданных раньше, id рецепта. Существование рецепта проверяется по
+    индексу в памяти, без запроса к базе"""
+    if code is not None:
+        recipe_id = decode(code)
+    if recipe_id is None or recipe_id not in live_recipes:
+        raise Http404(f"Рецепт {code or recipe_id} не найден")
+
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+async def redirect_recipe_async(request, code=None, recipe_id=None):
+    """redirect_recipe для ASGI (foodgram.fast_urls).
+
+    В цикле событий — только чтение индекса. При попадании версия в
+    кэше проверяется в фоне, при промахе запрос ждёт проверки в пуле
+    потоков: рецепт мог появиться в другом процессе."""
+    if code is not None:
+        recipe_id = decode(code)
+    if recipe_id is not None and not live_recipes.has(recipe_id):
+        await database_sync_to_async(live_recipes.refresh)()
+    if recipe_id is None or not live_recipes.has(recipe_id):
+        raise Http404(f"Рецепт {code or recipe_id} не найден")
+    live_recipes.refresh_in_background()
+
+    return redirect(f'/recipes/{recipe_id}/')
@@ -2,7 +2,6 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth import get_user_model
 from django.utils.html import format_html
-from django.db.models import Count
 
 from .models import Subscription
 
@@ -27,6 +26,12 @@ class CustomUserAdmin(UserAdmin):
 
     fieldsets = UserAdmin.fieldsets + (
         ('Дополнительная информация', {'fields': ('avatar',)}),
+        ('Статистика', {'fields': (
+            'recipes_count', 'subscriptions_count', 'subscribers_count'
+        )}),
+    )
+    readonly_fields = (
+        'recipes_count', 'subscriptions_count', 'subscribers_count'
     )
 
     add_fieldsets = (
@@ -43,14 +48,6 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        return queryset.annotate(
-            recipes_count=Count('recipes', distinct=True),
-            subscriptions_count=Count('subscriptions', distinct=True),
-            subscribers_count=Count('subscribers', distinct=True)
-        )
-
     @admin.display(description='ФИО')
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
@@ -61,18 +58,6 @@ class CustomUserAdmin(UserAdmin):
             return format_html('<img src="{}" width="30" height="30" />', obj.avatar.url)
         return "-"
 
-    @admin.display(description='Рецептов', ordering='recipes_count')
-    def recipes_count(self, obj):
-        return obj.recipes_count
-
-    @admin.display(description='Подписок', ordering='subscriptions_count')
-    def subscriptions_count(self, obj):
-        return obj.subscriptions_count
-
-    @admin.display(description='Подписчиков', ordering='subscribers_count')
-    def subscribers_count(self, obj):
-        return obj.subscribers_count
-
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
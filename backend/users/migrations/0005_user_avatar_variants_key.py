@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Ключ уменьшенных копий аватара'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_popular_authors(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.filter(
+        subscribers_count__gt=settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    ).update(feed_fanout=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_avatar_variants_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_fanout',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Рецепты раскладываются по лентам подписчиков'),
+        ),
+        migrations.RunPython(mark_popular_authors, migrations.RunPython.noop),
+    ]
@@ -32,6 +32,33 @@ class User(AbstractUser):
         blank=True,
         null=True
     )
+    avatar_variants_key = models.CharField(
+        verbose_name='Ключ уменьшенных копий аватара',
+        max_length=64,
+        blank=True,
+        default='',
+        editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False
+    )
+    feed_fanout = models.BooleanField(
+        verbose_name='Рецепты раскладываются по лентам подписчиков',
+        default=True,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from . import token_cache
+from .models import Subscription
+
+User = get_user_model()
+
+
+def update_subscription_counters(subscription, delta):
+    User.objects.filter(pk=subscription.user_id).update(
+        subscriptions_count=F('subscriptions_count') + delta
+    )
+    User.objects.filter(pk=subscription.author_id).update(
+        subscribers_count=F('subscribers_count') + delta
+    )
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        update_subscription_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    update_subscription_counters(instance, -1)
+
+
+def revoke_on_commit(*keys):
+    """Отзыв после фиксации транзакции: запрос, успевший закэшировать
+    старое состояние до неё, всё равно окажется раньше отметки"""
+    transaction.on_commit(lambda: token_cache.revoke(*keys))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Выход (djoser token_destroy) и удаление пользователя — каскадом
+    revoke_on_commit(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Смена пароля, деактивация и любое другое изменение пользователя:
+    в кэше хранится объект пользователя целиком"""
+    if created or update_fields is not None and (
+        set(update_fields) == {'last_login'}
+    ):
+        return
+    revoke_on_commit(*Token.objects.filter(
+        user_id=instance.pk
+    ).values_list('key', flat=True))
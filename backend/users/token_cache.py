@@ -0,0 +1,143 @@
+"""Кэш результатов аутентификации по токену.
+
+Два уровня: LRU в памяти процесса и общий кэш Django, оба по
+sha256 от ключа токена (сам ключ в кэш не попадает). При выходе,
+смене пароля, деактивации и удалении пользователя в общий кэш
+пишется отметка об отзыве: записи, сохранённые раньше неё, больше
+не принимаются ни одним процессом.
+
+В кэше лежат значения полей, а не сами объекты: каждый запрос
+получает свои экземпляры User и Token, которые можно менять, не
+задевая параллельные запросы. Счётчики пользователя (UNCACHED_FIELDS)
+меняются F()-выражениями без сигналов и в кэш не попадают: у
+восстановленного User они отложены, поэтому save() их не перезапишет,
+а чтение возьмёт свежие значения из базы.
+"""
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authtoken.models import Token
+
+SHARED_KEY = 'auth:token:{}'
+UNCACHED_FIELDS = frozenset((
+    'recipes_count', 'subscriptions_count', 'subscribers_count',
+    'feed_fanout',
+))
+REVOKED_KEY = 'auth:token:revoked:{}'
+
+
+def token_digest(key):
+    return sha256(key.encode()).hexdigest()
+
+
+def cached_fields(model):
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname not in UNCACHED_FIELDS
+    ]
+
+
+def dump(instance):
+    return tuple(
+        getattr(instance, name) for name in cached_fields(type(instance))
+    )
+
+
+def load(model, values):
+    """Поля не из кэша from_db делает отложенными"""
+    return model.from_db(DEFAULT_DB_ALIAS, cached_fields(model), values)
+
+
+def restore(entry):
+    """Новые (user, token) из записи кэша"""
+    user = load(get_user_model(), entry[0])
+    token = load(Token, entry[1])
+    token.user = user
+    return user, token
+
+
+class LocalTokenCache:
+    """LRU в памяти процесса: digest -> (поля user, поля token, filled_at)"""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, digest):
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            if entry[2] + settings.TOKEN_CACHE_LOCAL_TIMEOUT < time.time():
+                del self.entries[digest]
+                return None
+            self.entries.move_to_end(digest)
+            return entry
+
+    def set(self, digest, entry):
+        with self.lock:
+            self.entries[digest] = entry
+            self.entries.move_to_end(digest)
+            while len(self.entries) > settings.TOKEN_CACHE_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def discard(self, digest):
+        with self.lock:
+            self.entries.pop(digest, None)
+
+
+local_cache = LocalTokenCache()
+
+
+def is_revoked(filled_at, revoked_at):
+    return revoked_at is not None and filled_at <= revoked_at
+
+
+def get(key):
+    """(user, token) из кэша или None"""
+    digest = token_digest(key)
+    entry = local_cache.get(digest)
+    if entry is not None:
+        if not is_revoked(entry[2], cache.get(REVOKED_KEY.format(digest))):
+            return restore(entry)
+        local_cache.discard(digest)
+
+    shared_key = SHARED_KEY.format(digest)
+    revoked_key = REVOKED_KEY.format(digest)
+    found = cache.get_many([shared_key, revoked_key])
+    entry = found.get(shared_key)
+    if entry is None or is_revoked(entry[2], found.get(revoked_key)):
+        return None
+    local_cache.set(digest, entry)
+    return restore(entry)
+
+
+def store(key, user, token, filled_at):
+    """filled_at — время до чтения из базы: отзыв, зафиксированный
+    между чтением и записью в кэш, окажется позже и отменит запись"""
+    digest = token_digest(key)
+    entry = (dump(user), dump(token), filled_at)
+    cache.set(SHARED_KEY.format(digest), entry, settings.TOKEN_CACHE_TIMEOUT)
+    local_cache.set(digest, entry)
+
+
+def revoke(*keys):
+    """Отзывает закэшированные токены во всех процессах"""
+    if not keys:
+        return
+    now = time.time()
+    digests = [token_digest(key) for key in keys]
+    cache.delete_many([SHARED_KEY.format(digest) for digest in digests])
+    # Отметка живёт не меньше записей, которые она отменяет
+    cache.set_many(
+        {REVOKED_KEY.format(digest): now for digest in digests},
+        max(settings.TOKEN_CACHE_TIMEOUT, settings.TOKEN_CACHE_LOCAL_TIMEOUT)
+    )
+    for digest in digests:
+        local_cache.discard(digest)